@@ -1,16 +1,28 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from pymongo import ReturnDocument
+from collections import OrderedDict
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.database import tenants_collection, users_collection, projects_collection
+from app.database import tenants_collection, users_collection, projects_collection, refresh_tokens_collection, mongo_health
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from app.schemas import TokenData, UserRole
 
 # JWT ayarları
 SECRET_KEY = "your-secret-key-here"  # Production'da environment variable'dan alınmalı
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+# Rotasyondan hemen sonra aynı token tekrar gelirse (paralel istek, kaybolan yanıt) aile iptal edilmez
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = 30
 
 # Şifreleme ayarları
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -35,6 +47,111 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# Refresh token işlemleri
+def hash_refresh_token(token: str) -> str:
+    # Token yüksek entropili rastgele bir değer olduğu için bcrypt yerine sha256 yeterli
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def successor_refresh_token(token: str) -> str:
+    """Rotasyonda verilecek yeni token'ı eskisinden türetir
+
+    Türetme sunucu anahtarıyla yapıldığı için istemci tarafından hesaplanamaz; sadece hash
+    saklanmasına rağmen grace süresinde aynı yeni token tekrar döndürülebilir.
+    """
+    digest = hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+async def create_refresh_token(user: dict, family_id: Optional[str] = None, token: Optional[str] = None) -> str:
+    """Kullanıcı için yeni bir refresh token üretir, veritabanında sadece hash'i saklanır
+
+    Aynı login'den türeyen token'lar aynı family_id'yi paylaşır. token verilirse (rotasyon)
+    kayıt upsert edilir, böylece aynı token için tekrar çağrılabilir.
+    """
+    document = {
+        "family_id": family_id or str(uuid.uuid4()),
+        "user_id": user["id"],
+        "tenant_id": user["tenant_id"],
+        "revoked": False,
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    }
+    if token is None:
+        token = secrets.token_urlsafe(32)
+        await refresh_tokens_collection.insert_one({"token_hash": hash_refresh_token(token), **document})
+        return token
+
+    try:
+        await refresh_tokens_collection.update_one(
+            {"token_hash": hash_refresh_token(token)},
+            {"$setOnInsert": document},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Aynı anda gelen paralel rotasyon kaydı zaten oluşturdu
+        pass
+    return token
+
+async def rotate_refresh_token(token: str):
+    """Refresh token'ı tek kullanımlık olarak tüketir, kullanıcıyı ve yeni token'ı döner
+
+    Rotasyondan sonraki REFRESH_TOKEN_REUSE_GRACE_SECONDS içinde aynı token tekrar gelirse
+    (paralel istek veya yanıtı kaybolan istemci) ve yeni token henüz kullanılmamışsa
+    aynı yeni token döndürülür. Bunun dışında daha önce kullanılmış bir token tekrar gelirse
+    token çalınmış kabul edilir ve aynı ailedeki tüm token'lar iptal edilir.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_hash = hash_refresh_token(token)
+    new_token = successor_refresh_token(token)
+    new_token_hash = hash_refresh_token(new_token)
+    now = datetime.utcnow()
+    stored = await refresh_tokens_collection.find_one_and_update(
+        {"token_hash": token_hash, "revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {"revoked": True, "revoked_at": now, "successor_hash": new_token_hash}},
+        return_document=ReturnDocument.AFTER
+    )
+    if stored is None:
+        reused = await refresh_tokens_collection.find_one({"token_hash": token_hash, "revoked": True})
+        if reused is None:
+            raise credentials_exception
+        if not await _within_reuse_grace(reused, new_token_hash, now):
+            await revoke_refresh_token_family(reused["family_id"])
+            raise credentials_exception
+        stored = reused
+
+    user = await users_collection.find_one({"id": stored["user_id"]})
+    if user is None:
+        raise credentials_exception
+
+    await create_refresh_token(user, family_id=stored["family_id"], token=new_token)
+    return user, new_token
+
+async def _within_reuse_grace(reused: dict, new_token_hash: str, now: datetime) -> bool:
+    """Kullanılmış token'ın tekrarı rotasyonun grace süresi içinde ve yeni token kullanılmamış mı"""
+    if reused.get("successor_hash") != new_token_hash:
+        # Rotasyonla değil logout / aile iptaliyle kapatılmış
+        return False
+    if reused["revoked_at"] < now - timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+        return False
+    successor = await refresh_tokens_collection.find_one({"token_hash": new_token_hash})
+    # Paralel istek yeni token'ı henüz kaydetmemiş olabilir; kayıt upsert ile oluşturulur
+    return successor is None or not successor["revoked"]
+
+async def revoke_refresh_token_family(family_id: str):
+    await refresh_tokens_collection.update_many(
+        {"family_id": family_id, "revoked": False},
+        {"$set": {"revoked": True, "revoked_at": datetime.utcnow()}}
+    )
+
+async def revoke_refresh_token(token: str):
+    """Token'ın ait olduğu login oturumundaki tüm refresh token'ları iptal eder"""
+    stored = await refresh_tokens_collection.find_one({"token_hash": hash_refresh_token(token)})
+    if stored:
+        await revoke_refresh_token_family(stored["family_id"])
+
 # JWT token doğrulama
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -81,14 +198,52 @@ async def get_current_developer(current_user: dict = Depends(get_current_user)):
         )
     return current_user
 
+# Mongo erişilemezken ingest'in devam edebilmesi için son doğrulanan projeler (worker bazlı LRU)
+VERIFIED_PROJECT_CACHE_SIZE = int(os.getenv("VERIFIED_PROJECT_CACHE_SIZE", "10000"))
+_verified_projects: "OrderedDict[tuple, dict]" = OrderedDict()
+
+def _remember_project(key: tuple, project: dict):
+    _verified_projects[key] = project
+    _verified_projects.move_to_end(key)
+    if len(_verified_projects) > VERIFIED_PROJECT_CACHE_SIZE:
+        _verified_projects.popitem(last=False)
+
+def _verification_unavailable():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Project verification is temporarily unavailable"
+    )
+
+def _last_verified(key: tuple):
+    project = _verified_projects.get(key)
+    if project is None:
+        raise _verification_unavailable()
+    _verified_projects.move_to_end(key)
+    return project
+
 async def verify_project_access(tenant_id: str, project_id: str, bundle_id: str):
-    """Proje erişimini tenant_id, project_id ve bundle_id ile doğrular"""
-    project = await projects_collection.find_one({
-        "id": project_id,
-        "tenant_id": tenant_id,
-        "bundle_id": bundle_id,
-        "is_active": True
-    })
+    """Proje erişimini tenant_id, project_id ve bundle_id ile doğrular
+    
+    Mongo erişilemiyorsa daha önce doğrulanmış projeler için son bilinen proje dokümanı kullanılır;
+    bilinmeyen projeler için Mongo beklenmeden 503 döner.
+    """
+    key = (tenant_id, project_id, bundle_id)
+    if not mongo_health.healthy:
+        return _last_verified(key)
+    try:
+        project = await projects_collection.find_one({
+            "id": project_id,
+            "tenant_id": tenant_id,
+            "bundle_id": bundle_id,
+            "is_active": True
+        })
+    except ConnectionFailure:
+        mongo_health.mark_unhealthy()
+        return _last_verified(key)
+    if project:
+        _remember_project(key, project)
+    else:
+        _verified_projects.pop(key, None)
     if not project:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import itertools
+import os
+import time
+
+# Sorgu cache ayarları
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "15"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+QUERY_CACHE_NOW_WINDOW = int(os.getenv("QUERY_CACHE_NOW_WINDOW", "10"))
+# Generation ve ingest hızı tutulan en fazla proje sayısı
+QUERY_CACHE_MAX_PROJECTS = int(os.getenv("QUERY_CACHE_MAX_PROJECTS", "10000"))
+# Dakikada bundan az event alan projelerde ingest cache'i geçersiz kılar
+SMALL_PROJECT_EVENTS_PER_MINUTE = int(os.getenv("SMALL_PROJECT_EVENTS_PER_MINUTE", "120"))
+
+def rounded_now(window: int = QUERY_CACHE_NOW_WINDOW) -> datetime:
+    """Şu anı window saniyelik dilimin başına yuvarlar
+
+    Göreli zaman aralıkları (son 1 gün vb.) bu değere göre hesaplanırsa aynı dilimdeki
+    istekler aynı sorguyu üretir ve cache'i paylaşabilir.
+    """
+    now = datetime.utcnow()
+    return datetime.utcfromtimestamp((now - datetime(1970, 1, 1)).total_seconds() // window * window)
+
+class QueryCache:
+    """Kısa ömürlü, boyutu sınırlı (LRU) sorgu sonuç cache'i
+
+    Aynı anahtar için eş zamanlı gelen cache miss'lerde sorgu sadece bir kez çalışır,
+    diğer istekler aynı sonucu bekler (single-flight).
+    """
+
+    def __init__(
+        self,
+        ttl: float = QUERY_CACHE_TTL,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        max_projects: int = QUERY_CACHE_MAX_PROJECTS
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_projects = max_projects
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generations: "OrderedDict[tuple, int]" = OrderedDict()
+        self._generation_counter = itertools.count(1)
+        # Kaydı olmayan projelerin generation'ı; bir proje LRU'dan düşünce yenilenir
+        self._default_generation = 0
+        self._ingest_rates: "OrderedDict[tuple, list]" = OrderedDict()
+
+    async def get_or_load(
+        self,
+        tenant_id: str,
+        project_id: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable],
+        ttl: Optional[float] = None
+    ):
+        """Anahtarın değerini cache'ten döner, yoksa loader ile yükler
+
+        ttl verilmezse varsayılan QUERY_CACHE_TTL kullanılır.
+        """
+        project_key = (tenant_id, project_id)
+        while True:
+            full_key = (project_key, self._generations.get(project_key, self._default_generation), key)
+
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(full_key)
+                    return value
+                del self._entries[full_key]
+
+            inflight = self._inflight.get(full_key)
+            if inflight is None:
+                break
+            # wait() bu isteğin iptalini yayar ama yükleyen isteğin iptalini yaymaz
+            await asyncio.wait([inflight])
+            if not inflight.cancelled():
+                return inflight.result()
+            # Yükleyen istek iptal edildi (client bağlantıyı kapattı), yüklemeyi yeniden dene
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Bekleyen yoksa "exception was never retrieved" uyarısını engelle
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self._store(full_key, value, self.ttl if ttl is None else ttl)
+            return value
+        finally:
+            self._inflight.pop(full_key, None)
+
+    def _store(self, full_key: Hashable, value, ttl: float):
+        self._entries[full_key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(full_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_project(self, tenant_id: str, project_id: str):
+        """Projenin tüm cache kayıtlarını geçersiz kılar (eski kayıtlar LRU ile temizlenir)"""
+        project_key = (tenant_id, project_id)
+        self._generations[project_key] = next(self._generation_counter)
+        self._generations.move_to_end(project_key)
+        if len(self._generations) > self.max_projects:
+            # Düşen projenin eski kayıtları görünmesin diye kayıtsız projelerin generation'ı da yenilenir
+            self._generations.popitem(last=False)
+            self._default_generation = next(self._generation_counter)
+
+    def note_ingest(self, tenant_id: str, project_id: str, count: int = 1):
+        """Ingest sonrası çağrılır, küçük projelerde cache'i hemen geçersiz kılar
+
+        Yoğun projelerde her event'te geçersiz kılmak cache'i işe yaramaz hale getireceği
+        için bu projeler TTL ile tazelenir.
+        """
+        project_key = (tenant_id, project_id)
+        minute = int(time.monotonic() // 60)
+        rate = self._ingest_rates.get(project_key)
+        if rate is None or rate[0] != minute:
+            rate = [minute, 0]
+            self._ingest_rates[project_key] = rate
+        self._ingest_rates.move_to_end(project_key)
+        if len(self._ingest_rates) > self.max_projects:
+            self._ingest_rates.popitem(last=False)
+        rate[1] += count
+        if rate[1] <= SMALL_PROJECT_EVENTS_PER_MINUTE:
+            self.invalidate_project(tenant_id, project_id)
+
+query_cache = QueryCache()
@@ -1,11 +1,19 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure
+from datetime import datetime, timezone
 from bson.objectid import ObjectId
 import os
 
 # MongoDB bağlantı ayarları
 MONGO_DETAILS = os.getenv("MONGO_DETAILS", "mongodb://localhost:27017")
+# Mongo erişilemezken isteklerin uzun süre askıda kalmaması için
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
 
-client = AsyncIOMotorClient(MONGO_DETAILS)
+# Tüm metadata alanları için wildcard index (promote edilmiş alanlar yerine)
+METADATA_WILDCARD_INDEX = os.getenv("METADATA_WILDCARD_INDEX", "false").lower() == "true"
+
+client = AsyncIOMotorClient(MONGO_DETAILS, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
 
 # Veritabanı ve koleksiyonlar
 database = client.screen_tracker
@@ -16,7 +24,167 @@ sessions_collection = database.get_collection("sessions")
 screens_collection = database.get_collection("screens")
 events_collection = database.get_collection("events")
 invitation_tokens_collection = database.get_collection("invitation_tokens")
+devices_collection = database.get_collection("devices")
+export_jobs_collection = database.get_collection("export_jobs")
+jobs_collection = database.get_collection("jobs")
+retention_cohorts_collection = database.get_collection("retention_cohorts")
+dwell_sketches_collection = database.get_collection("dwell_sketches")
+refresh_tokens_collection = database.get_collection("refresh_tokens")
+trending_snapshots_collection = database.get_collection("trending_snapshots")
+project_stats_collection = database.get_collection("project_stats")
+unsampled_sessions_collection = database.get_collection("unsampled_sessions")
+
+# Mongo sağlık durumu (worker bazlı)
+class MongoHealth:
+    """Ingest yolunun Mongo'ya yazıp yazmayacağını belirler
+
+    Bağlantı hatası alındığında sağlıksız işaretlenir; spool arka plan görevi ping ile
+    tekrar erişilebilir olduğunu görene kadar ingest doğrudan spool'a yazar.
+    """
+
+    def __init__(self):
+        self.healthy = True
+        self.unhealthy_since = None
+
+    def mark_unhealthy(self):
+        if self.healthy:
+            self.healthy = False
+            self.unhealthy_since = datetime.utcnow()
+
+    def mark_healthy(self):
+        self.healthy = True
+        self.unhealthy_since = None
+
+    async def ping(self) -> bool:
+        try:
+            await client.admin.command("ping")
+        except ConnectionFailure:
+            return False
+        return True
+
+mongo_health = MongoHealth()
+
+# Tarihler Mongo'da naive UTC olarak tutulur
+def naive_utc(value: datetime) -> datetime:
+    """Timezone bilgili datetime'ı Mongo'da tutulan naive UTC formatına çevirir"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 # BSON ObjectId'yi string'e çeviren yardımcı fonksiyon
 def object_id_to_str(obj_id):
-    return str(obj_id) 
\ No newline at end of file
+    return str(obj_id)
+
+# Uygulama açılışında gerekli index'leri oluşturur
+async def ensure_indexes():
+    # Client event id ile idempotent ingest (boş string id'ler dedup dışında)
+    event_id_filter = {"event_id": {"$gt": ""}}
+    existing = (await events_collection.index_information()).get("event_id_unique")
+    if existing and existing.get("partialFilterExpression") != event_id_filter:
+        # Eski filtre ({"$type": "string"}) "" id'li eventleri de tekil sayıyordu
+        try:
+            await events_collection.drop_index("event_id_unique")
+        except OperationFailure:
+            # Başka bir worker önce silmiş
+            pass
+    await events_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("event_id", ASCENDING)],
+        name="event_id_unique",
+        unique=True,
+        partialFilterExpression=event_id_filter
+    )
+
+    # Session listeleme ve özet güncellemeleri
+    await sessions_collection.create_index([("id", ASCENDING)], name="session_id")
+    await sessions_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("created_at", ASCENDING)],
+        name="tenant_project_created_at"
+    )
+
+    # Cihaz profilleri
+    await devices_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("device_id", ASCENDING)],
+        name="device_unique",
+        unique=True
+    )
+    await devices_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("last_seen", DESCENDING), ("device_id", DESCENDING)],
+        name="tenant_project_last_seen"
+    )
+
+    # Zaman aralığı sorguları ve export
+    await events_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("timestamp", ASCENDING)],
+        name="tenant_project_timestamp"
+    )
+    await export_jobs_collection.create_index([("id", ASCENDING)], name="export_job_id", unique=True)
+    await export_jobs_collection.create_index([("status", ASCENDING)], name="export_job_status")
+
+    # Analitik işler
+    await jobs_collection.create_index([("id", ASCENDING)], name="job_id", unique=True)
+    await jobs_collection.create_index([("params_hash", ASCENDING), ("created_at", DESCENDING)], name="job_params_hash")
+    await jobs_collection.create_index([("status", ASCENDING)], name="job_status")
+    await jobs_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("created_at", DESCENDING)],
+        name="tenant_project_created_at"
+    )
+
+    # Retention cohort'ları
+    await devices_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("first_seen", ASCENDING)],
+        name="tenant_project_first_seen"
+    )
+    await retention_cohorts_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("cohort_day", ASCENDING), ("app_version", ASCENDING)],
+        name="retention_cohort_unique",
+        unique=True
+    )
+
+    # Günlük dwell time sketch'leri
+    await dwell_sketches_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("day", ASCENDING)],
+        name="dwell_day_unique",
+        unique=True
+    )
+
+    # Refresh token'lar (süresi dolanlar TTL index ile silinir)
+    await refresh_tokens_collection.create_index([("token_hash", ASCENDING)], name="token_hash_unique", unique=True)
+    await refresh_tokens_collection.create_index([("family_id", ASCENDING)], name="token_family")
+    await refresh_tokens_collection.create_index([("expires_at", ASCENDING)], name="token_expiry", expireAfterSeconds=0)
+
+    # Worker'ların trending snapshot'ları (en uzun pencereden sonra silinir)
+    await trending_snapshots_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING)],
+        name="tenant_project"
+    )
+    await trending_snapshots_collection.create_index([("updated_at", ASCENDING)], name="snapshot_expiry", expireAfterSeconds=3600)
+
+    # Session timeline ve ekran bilgisi lookup'ı
+    await events_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        name="tenant_project_session_timestamp"
+    )
+    await screens_collection.create_index(
+        [("token", ASCENDING), ("tenant_id", ASCENDING), ("project_id", ASCENDING)],
+        name="screen_token"
+    )
+    await screens_collection.create_index([("id", ASCENDING)], name="screen_id")
+
+    # Saatlik proje sayaçları (7 günlük pencereden sonra silinir)
+    await project_stats_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("hour", ASCENDING)],
+        name="project_hour_unique",
+        unique=True
+    )
+    await project_stats_collection.create_index([("hour", ASCENDING)], name="project_stats_expiry", expireAfterSeconds=8 * 24 * 3600)
+
+    # Örnekleme dışında kalan session işaretleri (session süresi dolunca silinir)
+    await unsampled_sessions_collection.create_index(
+        [("tenant_id", ASCENDING), ("project_id", ASCENDING), ("id", ASCENDING)],
+        name="tenant_project_session"
+    )
+    await unsampled_sessions_collection.create_index([("expires_at", ASCENDING)], name="unsampled_session_expiry", expireAfterSeconds=0)
+
+    # Metadata sorguları
+    if METADATA_WILDCARD_INDEX:
+        await events_collection.create_index([("metadata.$**", ASCENDING)], name="metadata_wildcard")
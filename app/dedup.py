@@ -0,0 +1,98 @@
+from array import array
+from typing import Iterable, List, Tuple
+import hashlib
+import os
+
+# Worker başına tutulacak event id sayısı (nesil başına)
+DEDUP_GENERATION_SIZE = int(os.getenv("DEDUP_GENERATION_SIZE", "100000"))
+
+def key_digest(key: Tuple[str, str, str]) -> int:
+    """Dedup anahtarının sıfırdan farklı 8 byte'lık blake2b özeti (0 boş slot işaretidir)"""
+    digest = hashlib.blake2b("\0".join(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") or 1
+
+class DigestTable:
+    """64 bit özetler için sabit boyutlu, açık adreslemeli (linear probing) hash tablosu
+
+    Kayıt başına 8 byte'lık slotlarda tutulur, doluluk oranı en fazla %50'dir.
+    """
+
+    def __init__(self, capacity: int):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self._slots = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self.count = 0
+
+    def _probe(self, digest: int) -> int:
+        slots, mask = self._slots, self._mask
+        index = digest & mask
+        while True:
+            value = slots[index]
+            if value == 0 or value == digest:
+                return index
+            index = (index + 1) & mask
+
+    def __contains__(self, digest: int) -> bool:
+        return self._slots[self._probe(digest)] == digest
+
+    def add(self, digest: int):
+        index = self._probe(digest)
+        if self._slots[index] != digest:
+            self._slots[index] = digest
+            self.count += 1
+
+class RecentEventIds:
+    """Worker bazlı, son görülen client event id'lerinin sınırlı hafızalı kümesi
+
+    İki nesilli tutulur: aktif nesil dolunca eski nesil atılır, aktif nesil eskiye döner.
+    Anahtarlar yerine 8 byte'lık özetleri sabit boyutlu tablolarda tutulur, böylece hafıza
+    generation_size'a göre sabittir (varsayılan ayarla ~4 MB). 64 bit özette çakışma
+    (yanlış pozitif) olasılığı ihmal edilebilir düzeydedir; buradan kaçan tekrarlar
+    veritabanındaki unique index tarafından yakalanır.
+    """
+
+    def __init__(self, generation_size: int = DEDUP_GENERATION_SIZE):
+        self.generation_size = generation_size
+        self._current = DigestTable(generation_size)
+        self._previous = DigestTable(0)
+
+    def __contains__(self, key: Tuple[str, str, str]) -> bool:
+        digest = key_digest(key)
+        return digest in self._current or digest in self._previous
+
+    def add(self, key: Tuple[str, str, str]):
+        if self._current.count >= self.generation_size:
+            self._previous = self._current
+            self._current = DigestTable(self.generation_size)
+        self._current.add(key_digest(key))
+
+    def add_many(self, keys: Iterable[Tuple[str, str, str]]):
+        for key in keys:
+            self.add(key)
+
+def event_key(document: dict):
+    """Dokümanın dedup anahtarını döner, event_id yoksa veya boşsa None
+
+    Boş id'ler unique index'in partial filtresinde de ({"$gt": ""}) dışarıda bırakılır.
+    """
+    event_id = document.get("event_id")
+    if not event_id:
+        return None
+    return (document["tenant_id"], document["project_id"], event_id)
+
+def split_duplicates(documents: List[dict]) -> Tuple[List[dict], int]:
+    """Daha önce görülmüş veya batch içinde tekrar eden eventleri ayıklar"""
+    unique, batch_keys, duplicates = [], set(), 0
+    for document in documents:
+        key = event_key(document)
+        if key is not None:
+            if key in recent_event_ids or key in batch_keys:
+                duplicates += 1
+                continue
+            batch_keys.add(key)
+        unique.append(document)
+    return unique, duplicates
+
+recent_event_ids = RecentEventIds()
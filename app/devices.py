@@ -0,0 +1,174 @@
+from app.database import devices_collection, sessions_collection, projects_collection, retention_cohorts_collection
+from app.jobs import job_type
+from pymongo import UpdateOne
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List
+import os
+
+# Aynı cihaz için last_seen güncellemeleri arasında beklenecek süre (saniye)
+DEVICE_TOUCH_INTERVAL = int(os.getenv("DEVICE_TOUCH_INTERVAL", "60"))
+SESSION_DEVICE_CACHE_SIZE = int(os.getenv("SESSION_DEVICE_CACHE_SIZE", "50000"))
+
+class _LRUCache(OrderedDict):
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+# session_id -> device_id eşlemesi ve cihazların son yazılan last_seen değerleri (worker bazlı)
+_session_devices = _LRUCache(SESSION_DEVICE_CACHE_SIZE)
+_last_touched = _LRUCache(SESSION_DEVICE_CACHE_SIZE)
+
+async def record_session(session_data: dict):
+    """Yeni oluşturulan session ile cihaz profilini günceller (yoksa oluşturur)"""
+    _session_devices.put(
+        (session_data["tenant_id"], session_data["project_id"], session_data["id"]),
+        session_data["device_id"]
+    )
+    await devices_collection.update_one(
+        {
+            "tenant_id": session_data["tenant_id"],
+            "project_id": session_data["project_id"],
+            "device_id": session_data["device_id"]
+        },
+        {
+            "$setOnInsert": {
+                "first_seen": session_data["created_at"],
+                "first_app_version": session_data["app_version"]
+            },
+            "$max": {"last_seen": session_data["created_at"]},
+            "$inc": {"session_count": 1},
+            "$addToSet": {"app_versions": session_data["app_version"]},
+            "$set": {
+                "last_session_id": session_data["id"],
+                "last_app_version": session_data["app_version"]
+            }
+        },
+        upsert=True
+    )
+
+async def _resolve_devices(keys: List[tuple]) -> Dict[tuple, str]:
+    """Session anahtarlarını cihaz id'lerine çevirir, bellekte olmayanları tek sorguda getirir"""
+    resolved, missing = {}, {}
+    for key in keys:
+        device_id = _session_devices.get(key)
+        if device_id is not None:
+            resolved[key] = device_id
+        else:
+            missing.setdefault((key[0], key[1]), []).append(key[2])
+
+    for (tenant_id, project_id), session_ids in missing.items():
+        sessions = await sessions_collection.find(
+            {"tenant_id": tenant_id, "project_id": project_id, "id": {"$in": session_ids}},
+            {"_id": 0, "id": 1, "device_id": 1}
+        ).to_list(length=None)
+        for session in sessions:
+            key = (tenant_id, project_id, session["id"])
+            _session_devices.put(key, session["device_id"])
+            resolved[key] = session["device_id"]
+    return resolved
+
+async def touch_devices(documents: List[dict]):
+    """Eklenen eventlere göre cihazların last_seen alanını günceller
+
+    Aynı cihaz için DEVICE_TOUCH_INTERVAL içinde en fazla bir yazma yapılır.
+    """
+    latest = {}
+    for document in documents:
+        key = (document["tenant_id"], document["project_id"], document["session_id"])
+        if key not in latest or document["timestamp"] > latest[key]:
+            latest[key] = document["timestamp"]
+
+    devices = await _resolve_devices(list(latest))
+    now = datetime.utcnow()
+    operations = []
+    for key, timestamp in latest.items():
+        device_id = devices.get(key)
+        if device_id is None:
+            continue
+        device_key = (key[0], key[1], device_id)
+        touched_at = _last_touched.get(device_key)
+        if touched_at is not None and (now - touched_at).total_seconds() < DEVICE_TOUCH_INTERVAL:
+            continue
+        _last_touched.put(device_key, now)
+        operations.append(UpdateOne(
+            {"tenant_id": key[0], "project_id": key[1], "device_id": device_id},
+            {"$max": {"last_seen": timestamp}}
+        ))
+
+    if operations:
+        await devices_collection.bulk_write(operations, ordered=False)
+
+def _literal(value):
+    # "$" ile başlayan string'ler update pipeline'ında alan yolu sayılmasın
+    return {"$literal": value}
+
+def _backfill_update(device: dict) -> list:
+    """Session'lardan hesaplanan profil değerlerini mevcut profille birleştiren update pipeline'ı"""
+    first_seen = device["first_seen"]
+    is_earlier = {"$or": [
+        {"$eq": [{"$type": "$first_seen"}, "missing"]},
+        {"$lt": [first_seen, "$first_seen"]}
+    ]}
+    return [{"$set": {
+        "first_app_version": {"$cond": [is_earlier, _literal(device["first_app_version"]), "$first_app_version"]},
+        "first_seen": {"$min": ["$first_seen", first_seen]},
+        "last_seen": {"$max": ["$last_seen", device["last_seen"]]},
+        "session_count": {"$max": [{"$ifNull": ["$session_count", 0]}, device["session_count"]]},
+        "app_versions": {"$setUnion": [{"$ifNull": ["$app_versions", []]}, _literal(device["app_versions"])]},
+        "last_session_id": {"$ifNull": ["$last_session_id", _literal(device["last_session_id"])]},
+        "last_app_version": {"$ifNull": ["$last_app_version", _literal(device["last_app_version"])]},
+    }}]
+
+@job_type("device_profiles")
+async def backfill_device_profiles(job: dict):
+    """Cihaz profillerini projenin tüm session'larından yeniden oluşturur
+
+    Profiller tutulmaya başlamadan önce görülen cihazların first_seen değerleri ancak bu
+    işle doğru olur. İş tamamlanınca proje `device_profiles_backfilled` olarak işaretlenir ve
+    retention artımlı hesaplamaya geçer.
+    """
+    tenant_id, project_id = job["tenant_id"], job["project_id"]
+    cursor = sessions_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id, "project_id": project_id}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$device_id",
+            "first_seen": {"$first": "$created_at"},
+            "first_app_version": {"$first": "$app_version"},
+            "last_seen": {"$last": "$created_at"},
+            "session_count": {"$sum": 1},
+            "app_versions": {"$addToSet": "$app_version"},
+            "last_session_id": {"$last": "$id"},
+            "last_app_version": {"$last": "$app_version"}
+        }}
+    ], allowDiskUse=True)
+
+    devices, operations = 0, []
+    async for device in cursor:
+        operations.append(UpdateOne(
+            {"tenant_id": tenant_id, "project_id": project_id, "device_id": device["_id"]},
+            _backfill_update(device),
+            upsert=True
+        ))
+        if len(operations) >= 1000:
+            await devices_collection.bulk_write(operations, ordered=False)
+            devices += len(operations)
+            operations = []
+    if operations:
+        await devices_collection.bulk_write(operations, ordered=False)
+        devices += len(operations)
+
+    # Eksik profillerle kaydedilmiş kesin cohort'lar bir sonraki hesaplamada yeniden üretilir
+    await retention_cohorts_collection.delete_many({"tenant_id": tenant_id, "project_id": project_id})
+    await projects_collection.update_one(
+        {"id": project_id, "tenant_id": tenant_id},
+        {"$set": {"device_profiles_backfilled": True}}
+    )
+    return {"devices": devices}
@@ -0,0 +1,215 @@
+from app.database import events_collection, sessions_collection, projects_collection, dwell_sketches_collection, naive_utc
+from app.jobs import job_type
+from app.screen_registry import screen_registry
+from app.sampling import weight_of
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import math
+import os
+
+# Dwell time ayarları
+DWELL_CAP_SECONDS = float(os.getenv("DWELL_CAP_SECONDS", "300"))  # Boşta kalma sınırı
+DWELL_SKETCH_ACCURACY = 0.01  # Quantile'lar için göreli hata
+SESSION_RESOLVE_BATCH = 1000
+MAX_DWELL_RANGE_DAYS = 90
+
+class QuantileSketch:
+    """Birleştirilebilir (mergeable) log-bucket quantile sketch'i (DDSketch benzeri)
+
+    Değerler göreli hatası DWELL_SKETCH_ACCURACY olan logaritmik kovalara sayılır. İki sketch
+    kova sayıları toplanarak birleştirilir, böylece günlük sketch'lerden istenen aralık
+    ham eventler tekrar okunmadan hesaplanır. Örneklenmiş session'ların değerleri
+    1 / örnekleme oranı ağırlığıyla eklenir, böylece sayılar tahmini toplamı gösterir.
+    """
+
+    def __init__(self, accuracy: float = DWELL_SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float, weight: float = 1.0):
+        index = math.ceil(math.log(max(value, 1e-3)) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        self.count += weight
+        self.total += value * weight
+
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "count": self.count,
+            "total": self.total,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls()
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        return sketch
+
+def session_dwell_times(events: List[dict]) -> List[tuple]:
+    """Zamana göre sıralı session eventlerinden (screen_token, süre) listesi üretir
+
+    Bir ekranın süresi bir sonraki screen_view'a kadar geçen süredir. Son ekran için
+    session'daki son event'e kadar geçen süre kullanılır. Tüm süreler DWELL_CAP_SECONDS ile sınırlanır.
+    """
+    views = [event for event in events if event["event_name"] == "screen_view"]
+    if not views:
+        return []
+
+    durations = []
+    for current, following in zip(views, views[1:]):
+        seconds = (following["timestamp"] - current["timestamp"]).total_seconds()
+        durations.append((current["screen_token"], min(seconds, DWELL_CAP_SECONDS)))
+
+    last_view = views[-1]
+    idle = (events[-1]["timestamp"] - last_view["timestamp"]).total_seconds()
+    if idle > 0:
+        durations.append((last_view["screen_token"], min(idle, DWELL_CAP_SECONDS)))
+    return durations
+
+async def _session_versions(tenant_id: str, project_id: str, session_ids: List[str]) -> Dict[str, str]:
+    sessions = await sessions_collection.find(
+        {"tenant_id": tenant_id, "project_id": project_id, "id": {"$in": session_ids}},
+        {"_id": 0, "id": 1, "app_version": 1}
+    ).to_list(length=None)
+    return {session["id"]: session.get("app_version") or "" for session in sessions}
+
+async def compute_day_sketches(tenant_id: str, project_id: str, day: datetime) -> Dict[tuple, QuantileSketch]:
+    """Bir günün eventlerini session ve zamana göre sıralı tek geçişte okuyup sketch'leri üretir
+
+    Anahtar (screen_token, app_version) ikilisidir. Bellekte en fazla SESSION_RESOLVE_BATCH
+    session'ın süreleri tutulur.
+    """
+    pipeline = [
+        {"$match": {
+            "tenant_id": tenant_id,
+            "project_id": project_id,
+            "timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}
+        }},
+        {"$sort": {"session_id": 1, "timestamp": 1}},
+        {"$project": {"_id": 0, "session_id": 1, "event_name": 1, "screen_token": 1, "timestamp": 1, "sample_rate": 1}}
+    ]
+
+    sketches: Dict[tuple, QuantileSketch] = {}
+    pending: Dict[str, tuple] = {}
+
+    async def flush():
+        versions = await _session_versions(tenant_id, project_id, list(pending))
+        for session_id, (durations, weight) in pending.items():
+            app_version = versions.get(session_id, "")
+            for screen_token, seconds in durations:
+                sketches.setdefault((screen_token, app_version), QuantileSketch()).add(seconds, weight)
+        pending.clear()
+
+    current_session, session_events = None, []
+    cursor = events_collection.aggregate(pipeline, allowDiskUse=True, batchSize=SESSION_RESOLVE_BATCH)
+    async for event in cursor:
+        if event["session_id"] != current_session:
+            if session_events:
+                pending[current_session] = (session_dwell_times(session_events), weight_of(session_events[0]))
+                if len(pending) >= SESSION_RESOLVE_BATCH:
+                    await flush()
+            current_session, session_events = event["session_id"], []
+        session_events.append(event)
+
+    if session_events:
+        pending[current_session] = (session_dwell_times(session_events), weight_of(session_events[0]))
+    if pending:
+        await flush()
+    return sketches
+
+async def load_day_sketches(tenant_id: str, project_id: str, day: datetime) -> Dict[tuple, QuantileSketch]:
+    """Günün sketch'lerini döner; kapanmış günler bir kez hesaplanıp kaydedilir"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if day >= today:
+        return await compute_day_sketches(tenant_id, project_id, day)
+
+    stored = await dwell_sketches_collection.find_one(
+        {"tenant_id": tenant_id, "project_id": project_id, "day": day}
+    )
+    if stored:
+        return {
+            (item["screen_token"], item["app_version"]): QuantileSketch.from_dict(item["sketch"])
+            for item in stored["sketches"]
+        }
+
+    sketches = await compute_day_sketches(tenant_id, project_id, day)
+    await dwell_sketches_collection.update_one(
+        {"tenant_id": tenant_id, "project_id": project_id, "day": day},
+        {"$set": {
+            "sketches": [
+                {"screen_token": screen_token, "app_version": app_version, "sketch": sketch.to_dict()}
+                for (screen_token, app_version), sketch in sketches.items()
+            ],
+            "computed_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+    return sketches
+
+async def dwell_times(
+    tenant_id: str,
+    project_id: str,
+    start: datetime,
+    end: datetime,
+    app_version: Optional[str] = None
+) -> Dict[str, QuantileSketch]:
+    """[start, end] günleri için ekran bazında birleştirilmiş sketch'leri döner"""
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    merged: Dict[str, QuantileSketch] = {}
+    while day <= end:
+        for (screen_token, version), sketch in (await load_day_sketches(tenant_id, project_id, day)).items():
+            if app_version is not None and version != app_version:
+                continue
+            merged.setdefault(screen_token, QuantileSketch()).merge(sketch)
+        day += timedelta(days=1)
+    return merged
+
+def summarize(sketches: Dict[str, QuantileSketch], screen_names: Dict[str, str]) -> List[dict]:
+    rows = [
+        {
+            "screen_token": screen_token,
+            "screen_name": screen_names.get(screen_token),
+            "count": round(sketch.count),
+            "average_seconds": sketch.mean(),
+            "median_seconds": sketch.quantile(0.5),
+            "p90_seconds": sketch.quantile(0.9),
+        }
+        for screen_token, sketch in sketches.items()
+    ]
+    return sorted(rows, key=lambda row: row["count"], reverse=True)
+
+@job_type("dwell_times")
+async def dwell_times_job(job: dict):
+    """Ekran bazında ortalama, medyan ve p90 ekranda kalma süreleri"""
+    params = job["params"]
+    end = naive_utc(datetime.fromisoformat(params["end"])) if params.get("end") else datetime.utcnow()
+    start = naive_utc(datetime.fromisoformat(params["start"])) if params.get("start") else end - timedelta(days=30)
+    sketches = await dwell_times(job["tenant_id"], job["project_id"], start, end, params.get("app_version"))
+    project = await projects_collection.find_one({"id": job["project_id"], "tenant_id": job["tenant_id"]})
+    screen_names = await screen_registry.get_tokens(project) if project else {}
+    return summarize(sketches, screen_names)
@@ -0,0 +1,360 @@
+from app.database import events_collection, export_jobs_collection
+from app.schemas import ExportFormat
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+import asyncio
+import csv
+import io
+import json
+import os
+import uuid
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:  # Parquet export opsiyonel
+    pyarrow = None
+
+# Export ayarları
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/tmp/screen-tracker-exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))  # Chunk / Parquet row group başına satır
+EXPORT_JOB_STALE_SECONDS = int(os.getenv("EXPORT_JOB_STALE_SECONDS", "120"))
+
+EXPORT_COLUMNS = ["event_id", "session_id", "event_name", "screen_token", "timestamp", "bundle_id", "metadata"]
+
+EXPORT_PROJECTION = {column: 1 for column in EXPORT_COLUMNS}
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+def build_export_query(
+    tenant_id: str,
+    project_id: str,
+    start: datetime,
+    end: datetime,
+    event_name: Optional[str] = None,
+    checkpoint: Optional[dict] = None
+) -> dict:
+    """Export sorgusunu oluşturur, checkpoint verilirse kaldığı yerden devam eder"""
+    query = {
+        "tenant_id": tenant_id,
+        "project_id": project_id,
+        "timestamp": {"$gte": start, "$lt": end}
+    }
+    if event_name:
+        query["event_name"] = event_name
+    if checkpoint:
+        query["$or"] = [
+            {"timestamp": {"$gt": checkpoint["timestamp"]}},
+            {"timestamp": checkpoint["timestamp"], "_id": {"$gt": checkpoint["_id"]}}
+        ]
+    return query
+
+async def iter_event_chunks(query: dict) -> AsyncIterator[List[dict]]:
+    """Eventleri (timestamp, _id) sırasıyla EXPORT_CHUNK_SIZE'lık parçalar halinde okur"""
+    cursor = events_collection.find(query, EXPORT_PROJECTION).sort(
+        [("timestamp", 1), ("_id", 1)]
+    ).batch_size(min(EXPORT_CHUNK_SIZE, 1000))
+
+    chunk = []
+    async for document in cursor:
+        chunk.append(document)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _row(document: dict) -> dict:
+    return {
+        "event_id": document.get("event_id"),
+        "session_id": document.get("session_id"),
+        "event_name": document.get("event_name"),
+        "screen_token": document.get("screen_token"),
+        "timestamp": document.get("timestamp"),
+        "bundle_id": document.get("bundle_id"),
+        "metadata": json.dumps(document["metadata"], default=str) if document.get("metadata") else None,
+    }
+
+class _CsvEncoder:
+    def header(self) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_COLUMNS)
+        return buffer.getvalue().encode()
+
+    def encode(self, documents: List[dict]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for document in documents:
+            row = _row(document)
+            row["timestamp"] = row["timestamp"].isoformat() if row["timestamp"] else None
+            writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        return buffer.getvalue().encode()
+
+    def close(self) -> bytes:
+        return b""
+
+class _NdjsonEncoder:
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, documents: List[dict]) -> bytes:
+        lines = []
+        for document in documents:
+            row = _row(document)
+            row["metadata"] = document.get("metadata")
+            lines.append(json.dumps(row, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)))
+        return ("\n".join(lines) + "\n").encode()
+
+    def close(self) -> bytes:
+        return b""
+
+class _ChunkSink(io.RawIOBase):
+    """ParquetWriter'ın yazdığı baytları toplayıp parça parça geri veren dosya benzeri nesne"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+class _ParquetEncoder:
+    def __init__(self):
+        self.schema = pyarrow.schema([
+            ("event_id", pyarrow.string()),
+            ("session_id", pyarrow.string()),
+            ("event_name", pyarrow.string()),
+            ("screen_token", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("ms")),
+            ("bundle_id", pyarrow.string()),
+            ("metadata", pyarrow.string()),
+        ])
+        self.sink = _ChunkSink()
+        self.writer = pyarrow_parquet.ParquetWriter(self.sink, self.schema, compression="snappy")
+
+    def header(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, documents: List[dict]) -> bytes:
+        rows = [_row(document) for document in documents]
+        table = pyarrow.Table.from_pylist(rows, schema=self.schema)
+        self.writer.write_table(table, row_group_size=len(rows))
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+def make_encoder(export_format: ExportFormat):
+    if export_format == ExportFormat.CSV:
+        return _CsvEncoder()
+    if export_format == ExportFormat.NDJSON:
+        return _NdjsonEncoder()
+    return _ParquetEncoder()
+
+async def stream_export(query: dict, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Eventleri seçilen formatta parça parça üretir, bellekte en fazla bir chunk tutulur
+
+    CSV/Parquet kodlaması event loop'u bloklamamak için thread'de yapılır.
+    """
+    encoder = make_encoder(export_format)
+    header = encoder.header()
+    if header:
+        yield header
+    async for chunk in iter_event_chunks(query):
+        data = await asyncio.to_thread(encoder.encode, chunk)
+        if data:
+            yield data
+    tail = await asyncio.to_thread(encoder.close)
+    if tail:
+        yield tail
+
+# Arka plan export işleri
+_running_jobs = {}
+
+def export_file_path(job_id: str, export_format: ExportFormat, claim_id: str) -> str:
+    # Her sahiplenme kendi dosyasına yazar, böylece düşmüş sanılan eski worker yeni dosyayı bozamaz
+    return os.path.join(EXPORT_DIR, f"{job_id}.{claim_id}.{ExportFormat(export_format).value}")
+
+async def _claim_job(job_id: str) -> Optional[dict]:
+    """İşi bu worker için sahiplenir (bekleyen veya heartbeat'i eskimiş işler)
+
+    Her sahiplenmede yeni bir claim_id üretilir; heartbeat ve sonuç güncellemeleri sadece
+    claim_id hâlâ bu worker'ınkiyse uygulanır.
+    """
+    now = datetime.utcnow()
+    return await export_jobs_collection.find_one_and_update(
+        {
+            "id": job_id,
+            "$or": [
+                {"status": "pending"},
+                {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)}}
+            ]
+        },
+        {"$set": {"status": "running", "claim_id": uuid.uuid4().hex, "heartbeat_at": now, "updated_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+
+def _copy_prefix(source: str, target: str, length: int):
+    """Önceki sahiplenmenin dosyasının ilk length byte'ını yeni dosyaya kopyalar"""
+    with open(source, "rb") as reader, open(target, "wb") as writer:
+        remaining = length
+        while remaining > 0:
+            data = reader.read(min(remaining, 1024 * 1024))
+            if not data:
+                raise EOFError("Export file is shorter than its checkpoint")
+            writer.write(data)
+            remaining -= len(data)
+        writer.flush()
+        os.fsync(writer.fileno())
+
+def _write(file, data: bytes) -> int:
+    written = file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
+    return written
+
+def _remove(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def run_export_job(job_id: str):
+    """Export işini çalıştırır, her chunk sonrası checkpoint kaydeder
+
+    CSV ve NDJSON işleri kaldığı byte ve event'ten devam eder. Parquet dosyası
+    footer ile kapandığı için yarım kalan Parquet işleri baştan başlar.
+    Dosya yazma ve fsync event loop'u bloklamamak için thread'de çalışır.
+    """
+    job = await _claim_job(job_id)
+    if not job:
+        return
+
+    claim_id = job["claim_id"]
+    owner = {"id": job_id, "status": "running", "claim_id": claim_id}
+    export_format = ExportFormat(job["format"])
+    path = export_file_path(job_id, export_format, claim_id)
+    previous_path = job.get("part_path")
+    await asyncio.to_thread(os.makedirs, EXPORT_DIR, exist_ok=True)
+
+    checkpoint = job.get("checkpoint")
+    rows = job.get("rows", 0)
+    bytes_written = job.get("bytes_written", 0)
+    if export_format == ExportFormat.PARQUET or not checkpoint or not previous_path:
+        checkpoint, rows, bytes_written = None, 0, 0
+    else:
+        try:
+            await asyncio.to_thread(_copy_prefix, previous_path, path, bytes_written)
+        except (OSError, EOFError):
+            checkpoint, rows, bytes_written = None, 0, 0
+
+    query = build_export_query(
+        tenant_id=job["tenant_id"],
+        project_id=job["project_id"],
+        start=job["start"],
+        end=job["end"],
+        event_name=job.get("event_name"),
+        checkpoint=checkpoint
+    )
+
+    try:
+        encoder = make_encoder(export_format)
+        file = await asyncio.to_thread(open, path, "r+b" if checkpoint else "wb")
+        try:
+            await asyncio.to_thread(file.seek, bytes_written)
+            if not checkpoint:
+                bytes_written += await asyncio.to_thread(_write, file, encoder.header())
+
+            async for chunk in iter_event_chunks(query):
+                data = await asyncio.to_thread(encoder.encode, chunk)
+                bytes_written += await asyncio.to_thread(_write, file, data)
+                rows += len(chunk)
+                last = chunk[-1]
+                now = datetime.utcnow()
+                result = await export_jobs_collection.update_one(
+                    owner,
+                    {"$set": {
+                        "checkpoint": {"timestamp": last["timestamp"], "_id": last["_id"]},
+                        "part_path": path,
+                        "rows": rows,
+                        "bytes_written": bytes_written,
+                        "heartbeat_at": now,
+                        "updated_at": now
+                    }}
+                )
+                if result.matched_count == 0:
+                    # İş iptal edilmiş veya başka bir worker tarafından devralınmış
+                    await asyncio.to_thread(file.close)
+                    await asyncio.to_thread(_remove, path)
+                    return
+
+            bytes_written += await asyncio.to_thread(_write, file, encoder.close())
+        finally:
+            await asyncio.to_thread(file.close)
+
+        now = datetime.utcnow()
+        result = await export_jobs_collection.update_one(
+            owner,
+            {"$set": {
+                "status": "completed",
+                "rows": rows,
+                "bytes_written": bytes_written,
+                "file_path": path,
+                "part_path": path,
+                "completed_at": now,
+                "updated_at": now
+            }}
+        )
+        if result.matched_count == 0:
+            await asyncio.to_thread(_remove, path)
+            return
+        if previous_path and previous_path != path:
+            await asyncio.to_thread(_remove, previous_path)
+    except Exception as e:
+        await export_jobs_collection.update_one(
+            owner,
+            {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow()}}
+        )
+    finally:
+        _running_jobs.pop(job_id, None)
+
+def start_export_job(job_id: str):
+    """Export işini arka planda başlatır"""
+    if job_id not in _running_jobs:
+        _running_jobs[job_id] = asyncio.create_task(run_export_job(job_id))
+
+async def resume_export_jobs():
+    """Yarım kalmış export işlerini devam ettirir (uygulama açılışında çağrılır)"""
+    stale_before = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    jobs = await export_jobs_collection.find(
+        {"$or": [
+            {"status": "pending"},
+            {"status": "running", "heartbeat_at": {"$lt": stale_before}}
+        ]},
+        {"id": 1}
+    ).to_list(length=None)
+    for job in jobs:
+        start_export_job(job["id"])
@@ -0,0 +1,299 @@
+from fastapi import HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from app.database import events_collection
+from app.schemas import EventTrack, UnknownScreenPolicy
+from app.screen_registry import screen_registry
+from app.dedup import recent_event_ids, event_key, split_duplicates
+from app.session_summary import update_session_summaries
+from app.devices import touch_devices
+from app.trending import trending
+from app.project_stats import record_event_stats
+from app.cache import query_cache
+from app.spool import event_spool, SpoolFull
+from app.database import mongo_health, naive_utc
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ConnectionFailure
+from typing import List
+from datetime import datetime
+import logging
+import msgpack
+
+# Ingest ayarları
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MAX_BATCH_SIZE = 1000
+
+_event_list_adapter = TypeAdapter(List[EventTrack])
+
+logger = logging.getLogger(__name__)
+
+# OpenAPI dokümantasyonu için body şemaları (body Request'ten elle okunduğu için)
+EVENT_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": EventTrack.model_json_schema()},
+            "application/msgpack": {"schema": EventTrack.model_json_schema()},
+        },
+    }
+}
+
+EVENT_BATCH_BODY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": EventTrack.model_json_schema()}},
+            "application/msgpack": {"schema": {"type": "array", "items": EventTrack.model_json_schema()}},
+        },
+    }
+}
+
+def _invalid(message: str):
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=message)
+
+def _parse_timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return naive_utc(value)
+    if isinstance(value, bool):
+        raise _invalid("timestamp must be a datetime")
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.utcfromtimestamp(value)
+        except (OverflowError, ValueError, OSError):
+            # Aralık dışı veya NaN/inf değerler
+            raise _invalid("timestamp must be a datetime")
+    if isinstance(value, str):
+        try:
+            return _parse_timestamp(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            pass
+    raise _invalid("timestamp must be a datetime")
+
+def _has_str_keys(value) -> bool:
+    """İç içe dict'lerin tüm anahtarları string mi (msgpack bytes anahtarlar BSON'a yazılamaz)"""
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if not all(isinstance(key, str) for key in value):
+                return False
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return True
+
+def validate_event(raw) -> dict:
+    """msgpack ile gelen eventi Pydantic kullanmadan doğrular
+
+    EventTrack.dict() ile aynı şekilde bir dict döner.
+    """
+    if not isinstance(raw, dict):
+        raise _invalid("Event must be an object")
+
+    event = {}
+    for field in ("screen_token", "session_id", "event_name"):
+        value = raw.get(field)
+        if not isinstance(value, str):
+            raise _invalid(f"{field} is required and must be a string")
+        event[field] = value
+
+    event["timestamp"] = _parse_timestamp(raw.get("timestamp"))
+
+    metadata = raw.get("metadata")
+    if metadata is not None and not isinstance(metadata, dict):
+        raise _invalid("metadata must be an object")
+    if metadata is not None and not _has_str_keys(metadata):
+        raise _invalid("metadata keys must be strings")
+    event["metadata"] = metadata
+
+    event_id = raw.get("event_id")
+    if event_id is not None and not isinstance(event_id, str):
+        raise _invalid("event_id must be a string")
+    event["event_id"] = event_id
+    return event
+
+def _is_msgpack(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in MSGPACK_CONTENT_TYPES
+
+def _unpack(body: bytes):
+    try:
+        return msgpack.unpackb(body, raw=False, timestamp=3, strict_map_key=True)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid msgpack body"
+        )
+
+async def read_event_payload(request: Request) -> dict:
+    """Request body'sinden tek bir event okur (JSON varsayılan, msgpack opsiyonel)"""
+    body = await request.body()
+    if _is_msgpack(request):
+        return validate_event(_unpack(body))
+
+    try:
+        event = EventTrack.model_validate_json(body).model_dump()
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    # msgpack yolu ile aynı doküman şekli: timestamp naive UTC
+    event["timestamp"] = naive_utc(event["timestamp"])
+    return event
+
+async def read_batch_payload(request: Request) -> List[dict]:
+    """Request body'sinden event listesi okur (JSON varsayılan, msgpack opsiyonel)"""
+    body = await request.body()
+    if _is_msgpack(request):
+        raw_events = _unpack(body)
+        if not isinstance(raw_events, list):
+            raise _invalid("Batch body must be an array of events")
+        events = None
+    else:
+        try:
+            events = [event.model_dump() for event in _event_list_adapter.validate_json(body)]
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        for event in events:
+            event["timestamp"] = naive_utc(event["timestamp"])
+        raw_events = events
+
+    if len(raw_events) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size cannot exceed {MAX_BATCH_SIZE} events"
+        )
+
+    if events is None:
+        events = [validate_event(raw) for raw in raw_events]
+    return events
+
+def build_event_document(event: dict, tenant_id: str, project_id: str, bundle_id: str) -> dict:
+    """Doğrulanmış eventi veritabanına yazılacak dokümana çevirir"""
+    event["tenant_id"] = tenant_id
+    event["project_id"] = project_id
+    event["bundle_id"] = bundle_id
+    if not event.get("timestamp"):
+        event["timestamp"] = datetime.utcnow()
+    return event
+
+async def apply_screen_policy(project: dict, documents: List[dict]) -> List[dict]:
+    """Bilinmeyen screen token'larını projenin politikasına göre işaretler veya eler
+
+    Tek event reddedilirse 400 döner, batch içinde reddedilen eventler listeden çıkarılır.
+    Token listesi Mongo erişilemediği için yüklenemezse eventler elenmeden (TAG politikasındaki
+    gibi) kabul edilir, böylece spool'a yazılabilirler; hangi token'ın bilinmediği
+    bilinemediği için işaretlenmezler.
+    """
+    policy = project.get("unknown_screen_policy", UnknownScreenPolicy.TAG)
+    if policy == UnknownScreenPolicy.ACCEPT:
+        return documents
+
+    try:
+        tokens = await screen_registry.get_tokens(project)
+    except ConnectionFailure:
+        mongo_health.mark_unhealthy()
+        return documents
+    accepted = []
+    for document in documents:
+        if document["screen_token"] in tokens:
+            accepted.append(document)
+        elif policy == UnknownScreenPolicy.TAG:
+            document["screen_known"] = False
+            accepted.append(document)
+
+    if not accepted and len(documents) == 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown screen token"
+        )
+    return accepted
+
+DUPLICATE_KEY_ERROR = 11000
+
+async def _insert(documents: List[dict]) -> List[dict]:
+    """Eventleri yazar, duplicate key hatası alanları atlayıp eklenenleri döner"""
+    if len(documents) == 1:
+        try:
+            await events_collection.insert_one(documents[0])
+        except DuplicateKeyError:
+            return []
+        return documents
+
+    try:
+        await events_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        failed = {error["index"] for error in errors}
+        return [document for index, document in enumerate(documents) if index not in failed]
+    return documents
+
+async def store_events(documents: List[dict]) -> List[dict]:
+    """Event dokümanlarını veritabanına yazar ve gerçekten eklenenleri döner
+
+    Aynı event_id ile tekrar gönderilen eventler önce worker'daki son id kümesinden,
+    oradan kaçanlar unique index'e takılarak sessizce atlanır. Mongo erişilemezse
+    eventler yerel spool'a yazılır ve Mongo düzelince arka planda replay edilir.
+    """
+    documents, _ = split_duplicates(documents)
+    if not documents:
+        return []
+
+    # _id önceden atanır, böylece yarım kalan yazmalar replay'de kopya oluşturmaz
+    for document in documents:
+        document.setdefault("_id", ObjectId())
+
+    inserted = None
+    if mongo_health.healthy:
+        try:
+            inserted = await _insert(documents)
+        except ConnectionFailure:
+            mongo_health.mark_unhealthy()
+
+    if inserted is None:
+        try:
+            await event_spool.append(documents)
+        except SpoolFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Event ingest is temporarily unavailable"
+            )
+
+    recent_event_ids.add_many(
+        key for key in map(event_key, documents) if key is not None
+    )
+    if inserted is None:
+        return documents
+    await after_insert(inserted)
+    return inserted
+
+async def replay_spooled_events(documents: List[dict]) -> int:
+    """Spool'dan okunan eventleri yazar, eklenen yeni event sayısını döner"""
+    inserted = await _insert(documents)
+    await after_insert(inserted)
+    return len(inserted)
+
+async def after_insert(documents: List[dict]):
+    """Veritabanına eklenen eventlerden türetilen verileri günceller
+
+    Eventler zaten yazıldığı için türetilen verilerden birinin hatası isteği düşürmez ve
+    diğerlerini engellemez; hata loglanıp devam edilir.
+    """
+    if not documents:
+        return
+    for hook in (update_session_summaries, touch_devices, record_event_stats):
+        try:
+            await hook(documents)
+        except Exception:
+            logger.exception("Post-insert hook %s failed for %d events", hook.__name__, len(documents))
+    try:
+        trending.record(documents)
+    except Exception:
+        logger.exception("Post-insert hook trending.record failed for %d events", len(documents))
+
+    projects = {}
+    for document in documents:
+        key = (document["tenant_id"], document["project_id"])
+        projects[key] = projects.get(key, 0) + 1
+    for (tenant_id, project_id), count in projects.items():
+        query_cache.note_ingest(tenant_id, project_id, count)
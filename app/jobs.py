@@ -0,0 +1,272 @@
+from app.database import jobs_collection, events_collection, naive_utc
+from app.sampling import WEIGHTED_COUNT
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+
+# Analitik iş ayarları
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_HEARTBEAT_SECONDS = 5
+
+# İş tipi -> iş fonksiyonu (job dokümanını alır, sonucu döner)
+JOB_TYPES: Dict[str, Callable[[dict], Awaitable]] = {}
+# Sadece admin kullanıcıların gönderebileceği iş tipleri
+ADMIN_JOB_TYPES: Set[str] = set()
+
+def job_type(name: str, admin_only: bool = False):
+    """Fonksiyonu belirtilen isimle analitik iş tipi olarak kaydeder"""
+    def register(func):
+        JOB_TYPES[name] = func
+        if admin_only:
+            ADMIN_JOB_TYPES.add(name)
+        return func
+    return register
+
+def params_hash(job_type_name: str, tenant_id: str, project_id: str, params: dict) -> str:
+    """Aynı parametrelerle gönderilen işleri eşleştirmek için hash üretir"""
+    payload = json.dumps(
+        {"type": job_type_name, "tenant_id": tenant_id, "project_id": project_id, "params": params},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def find_reusable_job(params_digest: str) -> Optional[dict]:
+    """Aynı parametrelerle çalışan veya süresi dolmamış sonucu olan işi bulur"""
+    return await jobs_collection.find_one(
+        {
+            "params_hash": params_digest,
+            "$or": [
+                {"status": {"$in": ["pending", "running"]}},
+                {"status": "completed", "completed_at": {"$gte": datetime.utcnow() - timedelta(hours=JOB_RESULT_TTL_HOURS)}}
+            ]
+        },
+        sort=[("created_at", -1)]
+    )
+
+class JobRunner:
+    """Analitik işleri sınırlı eş zamanlılıkla arka planda çalıştırır
+
+    İş durumu ve sonucu jobs koleksiyonunda tutulur, böylece herhangi bir worker'dan
+    sorgulanabilir. İptal edilen işler çalıştıkları worker'da heartbeat sırasında fark edilir.
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # İptali cancel() veya heartbeat ile istenen işler (diğer iptaller worker kapanışıdır)
+        self._cancel_requested: Set[str] = set()
+
+    def submit(self, job_id: str):
+        if job_id not in self._tasks:
+            self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def _claim(self, job_id: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await jobs_collection.find_one_and_update(
+            {
+                "id": job_id,
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}}
+                ]
+            },
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task):
+        while not task.done():
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            result = await jobs_collection.update_one(
+                {"id": job_id, "status": "running"},
+                {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+            if result.matched_count == 0:
+                self._cancel_requested.add(job_id)
+                task.cancel()
+                return
+
+    async def _run(self, job_id: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._semaphore:
+                job = await self._claim(job_id)
+                if not job:
+                    return
+
+                handler = JOB_TYPES.get(job["type"])
+                if handler is None:
+                    await self._finish(job_id, "failed", error=f"Unknown job type: {job['type']}")
+                    return
+
+                task = asyncio.create_task(handler(job))
+                heartbeat = asyncio.create_task(self._heartbeat(job_id, task))
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    if job_id not in self._cancel_requested:
+                        # Worker kapanıyor; iş resume() ile tekrar alınabilsin
+                        await self._release(job_id)
+                        raise
+                    await self._finish(job_id, "cancelled")
+                    return
+                except Exception as e:
+                    await self._finish(job_id, "failed", error=str(e))
+                    return
+                finally:
+                    heartbeat.cancel()
+
+                await self._finish(job_id, "completed", result=result)
+        finally:
+            self._tasks.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+
+    async def _release(self, job_id: str):
+        """Yarıda kalan işi tekrar bekleyen duruma alır"""
+        await jobs_collection.update_one(
+            {"id": job_id, "status": "running"},
+            {"$set": {"status": "pending", "updated_at": datetime.utcnow()}}
+        )
+
+    async def _finish(self, job_id: str, job_status: str, result=None, error: Optional[str] = None):
+        now = datetime.utcnow()
+        update = {"status": job_status, "updated_at": now}
+        if job_status == "completed":
+            update["result"] = result
+            update["completed_at"] = now
+        if error:
+            update["error"] = error
+        # İptal edilmiş bir işin durumu tekrar değiştirilmez
+        await jobs_collection.update_one(
+            {"id": job_id, "status": {"$ne": "cancelled"}} if job_status != "cancelled" else {"id": job_id},
+            {"$set": update}
+        )
+
+    async def cancel(self, job_id: str):
+        await jobs_collection.update_one(
+            {"id": job_id, "status": {"$in": ["pending", "running"]}},
+            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
+        )
+        task = self._tasks.get(job_id)
+        if task is not None:
+            self._cancel_requested.add(job_id)
+            task.cancel()
+
+    async def resume(self):
+        """Bekleyen veya sahibi düşmüş işleri devam ettirir (uygulama açılışında çağrılır)"""
+        stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        jobs = await jobs_collection.find(
+            {"$or": [
+                {"status": "pending"},
+                {"status": "running", "heartbeat_at": {"$lt": stale_before}}
+            ]},
+            {"id": 1}
+        ).to_list(length=None)
+        for job in jobs:
+            self.submit(job["id"])
+
+job_runner = JobRunner()
+
+async def create_job(job_type_name: str, tenant_id: str, project_id: str, params: dict, created_by: str) -> dict:
+    """İşi oluşturup çalıştırır; aynı parametrelerle çalışan veya yakın zamanda tamamlanmış iş varsa onu döner"""
+    digest = params_hash(job_type_name, tenant_id, project_id, params)
+    existing = await find_reusable_job(digest)
+    if existing:
+        if existing["status"] in ("pending", "running"):
+            job_runner.submit(existing["id"])
+        return existing
+
+    job_data = {
+        "id": str(uuid.uuid4()),
+        "type": job_type_name,
+        "tenant_id": tenant_id,
+        "project_id": project_id,
+        "params": params,
+        "params_hash": digest,
+        "status": "pending",
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    await jobs_collection.insert_one(job_data)
+    job_runner.submit(job_data["id"])
+    return job_data
+
+# Hazır analitik iş tipleri
+def _time_window(params: dict):
+    end = naive_utc(datetime.fromisoformat(params["end"])) if params.get("end") else datetime.utcnow()
+    start = naive_utc(datetime.fromisoformat(params["start"])) if params.get("start") else end - timedelta(days=90)
+    return start, end
+
+def _match_stage(job: dict, **extra) -> dict:
+    start, end = _time_window(job["params"])
+    match = {
+        "tenant_id": job["tenant_id"],
+        "project_id": job["project_id"],
+        "timestamp": {"$gte": start, "$lt": end}
+    }
+    match.update(extra)
+    return {"$match": match}
+
+@job_type("event_breakdown")
+async def event_breakdown(job: dict):
+    """Gün ve event adına göre event sayıları"""
+    pipeline = [
+        _match_stage(job),
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                "event_name": "$event_name"
+            },
+            "count": WEIGHTED_COUNT
+        }},
+        {"$sort": {"_id.day": 1, "count": -1}}
+    ]
+    rows = await events_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    return [{"day": row["_id"]["day"], "event_name": row["_id"]["event_name"], "count": round(row["count"])} for row in rows]
+
+@job_type("screen_breakdown")
+async def screen_breakdown(job: dict):
+    """Gün ve ekrana göre screen_view sayıları"""
+    pipeline = [
+        _match_stage(job, event_name="screen_view"),
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                "screen_token": "$screen_token"
+            },
+            "count": WEIGHTED_COUNT
+        }},
+        {"$sort": {"_id.day": 1, "count": -1}}
+    ]
+    rows = await events_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    return [{"day": row["_id"]["day"], "screen_token": row["_id"]["screen_token"], "count": round(row["count"])} for row in rows]
+
+@job_type("screen_flows")
+async def screen_flows(job: dict):
+    """Session içinde ardışık ekran geçişlerinin (A -> B) sayıları"""
+    limit = int(job["params"].get("limit", 200))
+    pipeline = [
+        _match_stage(job, event_name="screen_view"),
+        {"$setWindowFields": {
+            "partitionBy": "$session_id",
+            "sortBy": {"timestamp": 1},
+            "output": {"next_screen": {"$shift": {"output": "$screen_token", "by": 1}}}
+        }},
+        {"$match": {"next_screen": {"$ne": None}}},
+        {"$group": {"_id": {"from": "$screen_token", "to": "$next_screen"}, "count": WEIGHTED_COUNT}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]
+    rows = await events_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+    return [{"from": row["_id"]["from"], "to": row["_id"]["to"], "count": round(row["count"])} for row in rows]
@@ -1,8 +1,15 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import events, sessions, auth, projects
-from app.middleware import error_handling_middleware
+from app.routers import events, sessions, auth, projects, devices, exports, jobs, analytics
+from app.middleware import error_handling_middleware, CompressionMiddleware
 from app.auth import get_current_user
+from app.database import ensure_indexes
+from app.export import resume_export_jobs
+from app.jobs import job_runner
+from app.spool import event_spool
+from app.trending import trending
+from app.ingest import replay_spooled_events
+import asyncio
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 app = FastAPI(
@@ -43,14 +50,31 @@ app.add_middleware(
     allowed_hosts=["peekevent.xyz", "*.peekevent.xyz", "localhost", "0.0.0.0"]
 )
 
+# Request/response sıkıştırma (gzip/zstd)
+app.add_middleware(CompressionMiddleware)
+
 # Middleware ekleme
 app.middleware("http")(error_handling_middleware)
 
+@app.on_event("startup")
+async def on_startup():
+    await ensure_indexes()
+    await resume_export_jobs()
+    await job_runner.resume()
+    # Mongo kesintisinde biriken eventleri replay eden arka plan görevi
+    asyncio.create_task(event_spool.run(replay_spooled_events))
+    # Trending sayaçlarını diğer worker'larla paylaşan arka plan görevi
+    asyncio.create_task(trending.run())
+
 # Router'ları ekleme
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(projects.router, prefix="/api/projects", tags=["Projects"], dependencies=[Depends(get_current_user)])
 app.include_router(sessions.router, prefix="/api", tags=["Sessions"], dependencies=[Depends(get_current_user)])
 app.include_router(events.router, prefix="/api", tags=["Events"], dependencies=[Depends(get_current_user)])
+app.include_router(devices.router, prefix="/api", tags=["Devices"], dependencies=[Depends(get_current_user)])
+app.include_router(exports.router, prefix="/api", tags=["Exports"], dependencies=[Depends(get_current_user)])
+app.include_router(jobs.router, prefix="/api", tags=["Analytics Jobs"], dependencies=[Depends(get_current_user)])
+app.include_router(analytics.router, prefix="/api", tags=["Analytics"], dependencies=[Depends(get_current_user)])
 
 @app.get("/", tags=["Root"])
 def read_root():
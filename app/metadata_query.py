@@ -0,0 +1,237 @@
+from fastapi import HTTPException, Request, status
+from app.database import events_collection, projects_collection, METADATA_WILDCARD_INDEX
+from app.jobs import job_type
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import os
+import re
+import time
+
+# Metadata sorgu ayarları
+METADATA_UNINDEXED_SCAN_LIMIT = int(os.getenv("METADATA_UNINDEXED_SCAN_LIMIT", "100000"))
+# Tenant başına promote edilebilecek farklı alan sayısı
+METADATA_MAX_PROMOTED_FIELDS = int(os.getenv("METADATA_MAX_PROMOTED_FIELDS", "20"))
+# Index'ler tenant'lar arasında paylaşıldığı için koleksiyondaki toplam metadata index sınırı
+METADATA_MAX_INDEXES = int(os.getenv("METADATA_MAX_INDEXES", "40"))
+PROJECT_COUNT_TTL = 300
+
+METADATA_PREFIX = "metadata."
+# Promote edilen alan index'lerinin adı; "metadata_wildcard" ile çakışmaması için ayrı önek
+METADATA_INDEX_PREFIX = "metadata_field_"
+# Aynı anahtarlarla farklı isimde index var (eski "metadata_<alan>" isimli index'ler)
+INDEX_OPTIONS_CONFLICT = 85
+OPERATORS = {
+    "eq": "$eq",
+    "ne": "$ne",
+    "gt": "$gt",
+    "gte": "$gte",
+    "lt": "$lt",
+    "lte": "$lte",
+    "in": "$in",
+}
+FIELD_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)*$")
+
+PROJECT_COUNT_CACHE_SIZE = int(os.getenv("PROJECT_COUNT_CACHE_SIZE", "10000"))
+
+# Proje bazlı tahmini event sayıları (worker bazlı LRU)
+_project_counts: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def validate_field(field: str) -> str:
+    if not FIELD_PATTERN.match(field):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid metadata field: {field}"
+        )
+    return field
+
+def metadata_index_name(field: str) -> str:
+    return METADATA_INDEX_PREFIX + field
+
+def _coerce(value: str):
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+def _equality_values(value: str) -> list:
+    # SDK'lar aynı alanı string veya sayı olarak gönderebildiği için ikisi de eşleşir
+    coerced = _coerce(value)
+    return [coerced] if coerced == value else [coerced, value]
+
+def parse_metadata_params(request: Request) -> List[Tuple[str, str, str]]:
+    """Query string'deki metadata filtrelerini (alan, operatör, değer) listesine çevirir
+
+    Format: `metadata.<alan>=<değer>` (eşitlik) veya `metadata.<alan>__<op>=<değer>`,
+    op: eq, ne, gt, gte, lt, lte, in (virgülle ayrılmış liste)
+    """
+    filters = []
+    for key, value in request.query_params.multi_items():
+        if not key.startswith(METADATA_PREFIX):
+            continue
+        field, _, operator = key[len(METADATA_PREFIX):].partition("__")
+        operator = operator or "eq"
+        if operator not in OPERATORS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid metadata operator: {operator}. Use one of: {', '.join(OPERATORS)}"
+            )
+        filters.append((validate_field(field), operator, value))
+    return filters
+
+def build_filter(filters: List[Tuple[str, str, str]]) -> dict:
+    query = {}
+    for field, operator, value in filters:
+        path = METADATA_PREFIX + field
+        condition = query.setdefault(path, {})
+        if operator == "eq":
+            condition["$in"] = _equality_values(value)
+        elif operator == "in":
+            condition["$in"] = [item for part in value.split(",") for item in _equality_values(part)]
+        elif operator == "ne":
+            condition["$nin"] = _equality_values(value)
+        else:
+            condition[OPERATORS[operator]] = _coerce(value)
+    return query
+
+async def _project_event_count(tenant_id: str, project_id: str) -> int:
+    key = (tenant_id, project_id)
+    cached = _project_counts.get(key)
+    if cached and cached[0] > time.monotonic():
+        _project_counts.move_to_end(key)
+        return cached[1]
+    count = await events_collection.count_documents({"tenant_id": tenant_id, "project_id": project_id})
+    _project_counts[key] = (time.monotonic() + PROJECT_COUNT_TTL, count)
+    _project_counts.move_to_end(key)
+    if len(_project_counts) > PROJECT_COUNT_CACHE_SIZE:
+        _project_counts.popitem(last=False)
+    return count
+
+async def build_metadata_filter(request: Request, tenant_id: str, project_id: str) -> dict:
+    """Request'teki metadata filtrelerinden Mongo sorgusu üretir
+
+    Basit bir sorgu planlayıcısı uygular: filtrelenen alanlardan biri index'li değilse
+    (wildcard index yok ve alan projede promote edilmemişse, ya da alan sadece index
+    kullanamayan `ne` ile filtrelenmişse) ve projede METADATA_UNINDEXED_SCAN_LIMIT'ten
+    fazla event varsa sorgu reddedilir.
+    """
+    filters = parse_metadata_params(request)
+    if not filters:
+        return {}
+
+    indexed = None
+    if not METADATA_WILDCARD_INDEX:
+        project = await projects_collection.find_one(
+            {"id": project_id, "tenant_id": tenant_id},
+            {"_id": 0, "indexed_metadata_fields": 1}
+        )
+        if not project:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Project not found"
+            )
+        indexed = set(project.get("indexed_metadata_fields", []))
+
+    # ne ($nin) index'i kullanamaz; alan ancak index'e uygun başka bir filtreyle birlikte index'li sayılır
+    usable = {
+        field for field, operator, _ in filters
+        if operator != "ne" and (indexed is None or field in indexed)
+    }
+    unindexed = sorted({field for field, _, _ in filters} - usable)
+    if unindexed:
+        count = await _project_event_count(tenant_id, project_id)
+        if count > METADATA_UNINDEXED_SCAN_LIMIT:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=(
+                    f"Metadata fields {', '.join(unindexed)} cannot use an index for this project. "
+                    f"Promote them with POST /api/projects/{project_id}/metadata_indexes; "
+                    f"'ne' filters also need another filter on the same field"
+                )
+            )
+    return build_filter(filters)
+
+async def create_metadata_index(field: str):
+    """Promote edilen metadata alanı için partial index oluşturur
+
+    Index tüm projeler arasında paylaşılır; aynı alanı promote eden projeler aynı index'i kullanır.
+    """
+    try:
+        await events_collection.create_index(
+            [
+                ("tenant_id", ASCENDING),
+                ("project_id", ASCENDING),
+                (METADATA_PREFIX + field, ASCENDING),
+                ("timestamp", ASCENDING)
+            ],
+            name=metadata_index_name(field),
+            partialFilterExpression={METADATA_PREFIX + field: {"$exists": True}}
+        )
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+
+async def metadata_index_count() -> int:
+    indexes = await events_collection.index_information()
+    return sum(1 for name in indexes if name.startswith("metadata_") and name != "metadata_wildcard")
+
+async def tenant_metadata_fields(tenant_id: str) -> set:
+    """Tenant'ın projelerinde promote edilmiş veya index'i oluşturulmakta olan alanlar"""
+    rows = await projects_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id}},
+        {"$project": {"fields": {"$setUnion": [
+            {"$ifNull": ["$indexed_metadata_fields", []]},
+            {"$ifNull": ["$pending_metadata_fields", []]}
+        ]}}},
+        {"$unwind": "$fields"},
+        {"$group": {"_id": "$fields"}}
+    ]).to_list(length=None)
+    return {row["_id"] for row in rows}
+
+async def within_metadata_quota(tenant_id: str, field: str) -> bool:
+    """Alan promote edilirse tenant METADATA_MAX_PROMOTED_FIELDS sınırında kalır mı"""
+    fields = await tenant_metadata_fields(tenant_id)
+    return field in fields or len(fields) < METADATA_MAX_PROMOTED_FIELDS
+
+@job_type("metadata_index", admin_only=True)
+async def metadata_index_job(job: dict):
+    """Promote edilen metadata alanının index'ini oluşturur ve alanı projede index'li işaretler
+
+    Index büyük koleksiyonlarda uzun sürede oluştuğu için istek içinde değil iş olarak çalışır.
+    Başarısız olursa alan projenin bekleyen alanlarından çıkarılır.
+    """
+    field = job["params"].get("field")
+    if not isinstance(field, str) or not FIELD_PATTERN.match(field):
+        raise ValueError("Invalid metadata field")
+    project_query = {"id": job["project_id"], "tenant_id": job["tenant_id"]}
+
+    try:
+        if not await within_metadata_quota(job["tenant_id"], field):
+            raise ValueError("Maximum number of indexed metadata fields reached for this tenant")
+        if metadata_index_name(field) not in await events_collection.index_information():
+            if await metadata_index_count() >= METADATA_MAX_INDEXES:
+                raise ValueError("Maximum number of metadata indexes reached")
+            await create_metadata_index(field)
+    except BaseException:
+        await projects_collection.update_one(project_query, {"$pull": {"pending_metadata_fields": field}})
+        raise
+
+    await projects_collection.update_one(project_query, {
+        "$addToSet": {"indexed_metadata_fields": field},
+        "$pull": {"pending_metadata_fields": field},
+        "$set": {"updated_at": datetime.utcnow()}
+    })
+    return {"field": field, "index": metadata_index_name(field)}
+
+def metadata_cache_key(request: Request) -> tuple:
+    return tuple(sorted(
+        (key, value) for key, value in request.query_params.multi_items()
+        if key.startswith(METADATA_PREFIX)
+    ))
@@ -1,9 +1,254 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from anyio import to_thread
+import gzip
+import zlib
+import os
+
+try:
+    import zstandard
+except ImportError:  # zstd opsiyonel, yoksa sadece gzip kullanılır
+    zstandard = None
+
+# Sıkıştırma ayarları
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(256 * 1024)))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+MAX_COMPRESSED_BODY_SIZE = int(os.getenv("MAX_COMPRESSED_BODY_SIZE", str(5 * 1024 * 1024)))
+MAX_DECOMPRESSED_BODY_SIZE = int(os.getenv("MAX_DECOMPRESSED_BODY_SIZE", str(20 * 1024 * 1024)))
+
+# Zaten sıkıştırılmış içerik tipleri tekrar sıkıştırılmaz
+UNCOMPRESSIBLE_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "application/zip", "application/gzip", "application/vnd.apache.parquet"
+)
 
 # Hata yönetimi middleware
 async def error_handling_middleware(request: Request, call_next):
     try:
         return await call_next(request)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"message": str(e)}) 
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"message": str(e)})
+
+class BodyTooLarge(Exception):
+    pass
+
+def _supported_encodings():
+    encodings = ["gzip"]
+    if zstandard is not None:
+        encodings.insert(0, "zstd")
+    return encodings
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    """Request body'sini açar, limit aşılırsa BodyTooLarge fırlatır (decompression bomb koruması)
+
+    Birden fazla gzip member'ı / zstd frame'i art arda açılır, limit hepsinin toplamına uygulanır.
+    Yarım kalan veya sonunda tanınmayan byte'lar olan body'ler reddedilir.
+    """
+    chunks, size = [], 0
+    if encoding == "gzip":
+        remaining = body
+        while True:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = decompressor.decompress(remaining, MAX_DECOMPRESSED_BODY_SIZE - size + 1)
+            size += len(data)
+            chunks.append(data)
+            if size > MAX_DECOMPRESSED_BODY_SIZE or decompressor.unconsumed_tail:
+                raise BodyTooLarge()
+            if not decompressor.eof:
+                raise zlib.error("Truncated gzip body")
+            remaining = decompressor.unused_data
+            if not remaining:
+                return b"".join(chunks)
+
+    decompressor = zstandard.ZstdDecompressor()
+    with decompressor.stream_reader(body, read_across_frames=True) as reader:
+        while True:
+            data = reader.read(MAX_DECOMPRESSED_BODY_SIZE - size + 1)
+            if not data:
+                return b"".join(chunks)
+            size += len(data)
+            chunks.append(data)
+            if size > MAX_DECOMPRESSED_BODY_SIZE:
+                raise BodyTooLarge()
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=COMPRESSION_LEVEL)
+
+def _negotiate_encoding(accept_encoding: str):
+    """Accept-Encoding header'ından desteklenen en uygun encoding'i seçer"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in _supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+async def _send_error(send, status_code: int, message: str):
+    response = JSONResponse(status_code=status_code, content={"message": message})
+    await send({"type": "http.response.start", "status": response.status_code, "headers": response.raw_headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+class CompressionMiddleware:
+    """gzip/zstd ile sıkıştırılmış request body'lerini açar ve response'ları sıkıştırır
+
+    - Request: Content-Encoding gzip veya zstd ise body limitler dahilinde açılır
+    - Response: Accept-Encoding'e göre COMPRESSION_MIN_SIZE üzerindeki cevaplar sıkıştırılır,
+      COMPRESSION_THREAD_THRESHOLD üzerindeki cevaplar event loop'u bloklamamak için thread'de sıkıştırılır
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "").strip().lower()
+        if content_encoding and content_encoding != "identity":
+            if content_encoding not in _supported_encodings():
+                await _send_error(send, 415, f"Unsupported Content-Encoding: {content_encoding}")
+                return
+            try:
+                body = await self._read_body(receive)
+                if len(body) > COMPRESSION_THREAD_THRESHOLD:
+                    body = await to_thread.run_sync(_decompress, body, content_encoding)
+                else:
+                    body = _decompress(body, content_encoding)
+            except BodyTooLarge:
+                await _send_error(send, 413, "Request body too large")
+                return
+            except Exception:
+                await _send_error(send, 400, "Invalid compressed request body")
+                return
+
+            scope = dict(scope)
+            scope["headers"] = [
+                (key, value) for key, value in scope["headers"]
+                if key not in (b"content-encoding", b"content-length")
+            ] + [(b"content-length", str(len(body)).encode())]
+            receive = self._replay_body(body)
+
+        encoding = _negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding)
+        await self.app(scope, receive, responder)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_COMPRESSED_BODY_SIZE:
+                raise BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes):
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return receive
+
+class _CompressionResponder:
+    """Response'u yakalayıp boyutuna göre sıkıştırarak gönderir"""
+
+    def __init__(self, send, encoding: str):
+        self.send = send
+        self.encoding = encoding
+        self.start_message = None
+        self.skip = False
+        self.streaming = False
+        self.stream_compressor = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.skip = (
+                "content-encoding" in headers
+                or content_type.startswith(UNCOMPRESSIBLE_CONTENT_TYPES)
+            )
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.skip:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.streaming and not more_body:
+            # Tek parça response
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if len(body) >= COMPRESSION_MIN_SIZE:
+                if len(body) > COMPRESSION_THREAD_THRESHOLD:
+                    body = await to_thread.run_sync(_compress, body, self.encoding)
+                else:
+                    body = _compress(body, self.encoding)
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        if not self.streaming:
+            # Streaming response, chunk'lar geldikçe sıkıştırılır
+            self.streaming = True
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            if self.encoding == "zstd":
+                self.stream_compressor = zstandard.ZstdCompressor(level=3).compressobj()
+            else:
+                self.stream_compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            await self.send(self.start_message)
+
+        data = self.stream_compressor.compress(body)
+        if more_body:
+            if self.encoding == "zstd":
+                data += self.stream_compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            else:
+                data += self.stream_compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data += self.stream_compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
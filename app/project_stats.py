@@ -0,0 +1,147 @@
+from app.database import project_stats_collection, events_collection, sessions_collection, devices_collection, projects_collection
+from app.jobs import job_type
+from app.sampling import weight_of, WEIGHTED_COUNT
+from pymongo import UpdateOne, DESCENDING
+from datetime import datetime, timedelta
+from typing import Dict, List
+import asyncio
+
+# Saatlik proje sayaçları en fazla bu kadar geriye gider
+STATS_WINDOW_DAYS = 7
+
+def hour_of(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _counter_update(tenant_id: str, project_id: str, hour: datetime, update: dict) -> UpdateOne:
+    return UpdateOne(
+        {"tenant_id": tenant_id, "project_id": project_id, "hour": hour},
+        update,
+        upsert=True
+    )
+
+async def record_event_stats(documents: List[dict]):
+    """Eklenen eventleri proje ve saat bazında sayaçlara ekler (örnekleme ağırlığıyla)"""
+    if not documents:
+        return
+    now = datetime.utcnow()
+    groups: Dict[tuple, list] = {}
+    for document in documents:
+        timestamp = min(document["timestamp"], now)
+        key = (document["tenant_id"], document["project_id"], hour_of(timestamp))
+        group = groups.setdefault(key, [0.0, timestamp])
+        group[0] += weight_of(document)
+        group[1] = max(group[1], timestamp)
+
+    operations = [
+        _counter_update(tenant_id, project_id, hour, {
+            "$inc": {"events": events},
+            "$max": {"last_event_at": last_event_at}
+        })
+        for (tenant_id, project_id, hour), (events, last_event_at) in groups.items()
+    ]
+    await project_stats_collection.bulk_write(operations, ordered=False)
+
+async def record_session_stats(session: dict):
+    """Yeni session'ı proje ve saat bazında sayaçlara ekler"""
+    await project_stats_collection.bulk_write([
+        _counter_update(session["tenant_id"], session["project_id"], hour_of(session["created_at"]), {
+            "$inc": {"sessions": weight_of(session)}
+        })
+    ])
+
+async def _last_event_at(tenant_id: str, project_id: str):
+    event = await events_collection.find_one(
+        {"tenant_id": tenant_id, "project_id": project_id},
+        {"_id": 0, "timestamp": 1},
+        sort=[("timestamp", DESCENDING)]
+    )
+    return event["timestamp"] if event else None
+
+async def projects_overview(tenant_id: str) -> List[dict]:
+    """Tenant'ın tüm projelerini son 24 saat / 7 gün sayılarıyla birlikte döner
+
+    Session ve event sayıları saatlik sayaçlardan, aktif cihaz sayıları cihaz profillerinin
+    son görülme zamanından tek bir gruplama ile hesaplanır. Örnekleme session bazında olduğu
+    için cihaz sayıları ölçeklenmez, sadece örneklenen session'ları olan cihazlar sayılır. Sayaç penceresinde hiç event'i
+    olmayan projelerin son event zamanı event index'inden okunur.
+    """
+    now = datetime.utcnow()
+    day_ago = now - timedelta(days=1)
+    week_ago = now - timedelta(days=STATS_WINDOW_DAYS)
+
+    projects = await projects_collection.find({"tenant_id": tenant_id}).to_list(length=None)
+
+    counters = await project_stats_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id, "hour": {"$gte": hour_of(week_ago)}}},
+        {"$group": {
+            "_id": "$project_id",
+            "sessions_7d": {"$sum": "$sessions"},
+            "events_7d": {"$sum": "$events"},
+            "sessions_24h": {"$sum": {"$cond": [{"$gte": ["$hour", hour_of(day_ago)]}, "$sessions", 0]}},
+            "events_24h": {"$sum": {"$cond": [{"$gte": ["$hour", hour_of(day_ago)]}, "$events", 0]}},
+            "last_event_at": {"$max": "$last_event_at"}
+        }}
+    ]).to_list(length=None)
+    counters = {row["_id"]: row for row in counters}
+
+    devices = await devices_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id, "last_seen": {"$gte": week_ago}}},
+        {"$group": {
+            "_id": "$project_id",
+            "active_devices_7d": {"$sum": 1},
+            "active_devices_24h": {"$sum": {"$cond": [{"$gte": ["$last_seen", day_ago]}, 1, 0]}}
+        }}
+    ]).to_list(length=None)
+    devices = {row["_id"]: row for row in devices}
+
+    idle = [project["id"] for project in projects if not (counters.get(project["id"]) or {}).get("last_event_at")]
+    last_events = dict(zip(idle, await asyncio.gather(*(_last_event_at(tenant_id, project_id) for project_id in idle))))
+
+    overview = []
+    for project in projects:
+        counter = counters.get(project["id"], {})
+        device = devices.get(project["id"], {})
+        project["stats"] = {
+            "sessions_24h": round(counter.get("sessions_24h", 0)),
+            "sessions_7d": round(counter.get("sessions_7d", 0)),
+            "events_24h": round(counter.get("events_24h", 0)),
+            "events_7d": round(counter.get("events_7d", 0)),
+            "last_event_at": counter.get("last_event_at") or last_events.get(project["id"]),
+            "active_devices_24h": device.get("active_devices_24h", 0),
+            "active_devices_7d": device.get("active_devices_7d", 0),
+        }
+        overview.append(project)
+    return overview
+
+@job_type("project_stats")
+async def rebuild_project_stats(job: dict):
+    """Projenin son 7 günlük saatlik sayaçlarını ham event ve session'lardan yeniden hesaplar
+
+    Sayaçlar tutulmaya başlamadan önceki veriler için bir kez çalıştırılır. Çalışma sırasında
+    gelen eventler yeniden hesaplanan saatlerde kaybolabilir.
+    """
+    tenant_id, project_id = job["tenant_id"], job["project_id"]
+    since = hour_of(datetime.utcnow() - timedelta(days=STATS_WINDOW_DAYS))
+    hour = {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}}
+
+    events = await events_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id, "project_id": project_id, "timestamp": {"$gte": since}}},
+        {"$group": {"_id": hour, "events": WEIGHTED_COUNT, "last_event_at": {"$max": "$timestamp"}}}
+    ], allowDiskUse=True).to_list(length=None)
+    sessions = await sessions_collection.aggregate([
+        {"$match": {"tenant_id": tenant_id, "project_id": project_id, "created_at": {"$gte": since}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$created_at", "unit": "hour"}}, "sessions": WEIGHTED_COUNT}}
+    ], allowDiskUse=True).to_list(length=None)
+
+    hours: Dict[datetime, dict] = {}
+    for row in events:
+        hours.setdefault(row["_id"], {"events": 0, "sessions": 0}).update(events=row["events"], last_event_at=row["last_event_at"])
+    for row in sessions:
+        hours.setdefault(row["_id"], {"events": 0, "sessions": 0})["sessions"] = row["sessions"]
+
+    if hours:
+        await project_stats_collection.bulk_write([
+            _counter_update(tenant_id, project_id, hour_start, {"$set": counts})
+            for hour_start, counts in hours.items()
+        ], ordered=False)
+    return {"hours": len(hours)}
@@ -0,0 +1,275 @@
+from app.database import sessions_collection, devices_collection, retention_cohorts_collection, projects_collection
+from app.jobs import job_type
+from app.sampling import has_sampled_sessions
+from pymongo import UpdateOne
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import numpy as np
+
+# Hesaplanan day-N retention değerleri
+RETENTION_DAYS = (1, 7, 30)
+STREAM_BATCH_SIZE = 5000
+
+EPOCH = datetime(1970, 1, 1)
+ONE_DAY = timedelta(days=1)
+
+class SampledProjectError(ValueError):
+    """Retention örneklenmiş session'ı olan projelerde hesaplanamaz"""
+
+def day_index(value: datetime) -> int:
+    return (value - EPOCH) // ONE_DAY
+
+def day_from_index(index: int) -> datetime:
+    return EPOCH + timedelta(days=int(index))
+
+class SessionArrays:
+    """Session'ların sadece gerekli alanlarını tutan sıkıştırılmış diziler
+
+    Cihaz ve versiyon string'leri tamsayı kodlara çevrilir, tarih gün indeksine indirgenir.
+    """
+
+    def __init__(self):
+        self.device_codes: Dict[str, int] = {}
+        self.version_codes: Dict[str, int] = {}
+        self._devices = array("i")
+        self._days = array("i")
+        self._versions = array("i")
+
+    def device_code(self, device_id: str) -> int:
+        code = self.device_codes.get(device_id)
+        if code is None:
+            code = self.device_codes[device_id] = len(self.device_codes)
+        return code
+
+    def version_code(self, app_version: str) -> int:
+        code = self.version_codes.get(app_version)
+        if code is None:
+            code = self.version_codes[app_version] = len(self.version_codes)
+        return code
+
+    def append(self, device_id: str, created_at: datetime, app_version: str):
+        self._devices.append(self.device_code(device_id))
+        self._days.append(day_index(created_at))
+        self._versions.append(self.version_code(app_version))
+
+    def arrays(self):
+        return (
+            np.frombuffer(self._devices, dtype=np.int32),
+            np.frombuffer(self._days, dtype=np.int32),
+            np.frombuffer(self._versions, dtype=np.int32),
+        )
+
+async def stream_sessions(tenant_id: str, project_id: str, since: Optional[datetime], sessions: SessionArrays):
+    query = {"tenant_id": tenant_id, "project_id": project_id}
+    if since is not None:
+        query["created_at"] = {"$gte": since}
+    cursor = sessions_collection.find(
+        query,
+        {"_id": 0, "device_id": 1, "created_at": 1, "app_version": 1}
+    ).batch_size(STREAM_BATCH_SIZE)
+    async for session in cursor:
+        sessions.append(session["device_id"], session["created_at"], session.get("app_version") or "")
+
+def first_seen(devices: np.ndarray, days: np.ndarray, versions: np.ndarray, n_devices: int):
+    """Her cihazın ilk görüldüğü gün ve o günkü versiyonu"""
+    first_day = np.full(n_devices, -1, dtype=np.int32)
+    first_version = np.full(n_devices, -1, dtype=np.int32)
+    if len(devices) == 0:
+        return first_day, first_version
+    order = np.lexsort((days, devices))
+    sorted_devices = devices[order]
+    is_first = np.empty(len(order), dtype=bool)
+    is_first[0] = True
+    np.not_equal(sorted_devices[1:], sorted_devices[:-1], out=is_first[1:])
+    first_rows = order[is_first]
+    first_day[devices[first_rows]] = days[first_rows]
+    first_version[devices[first_rows]] = versions[first_rows]
+    return first_day, first_version
+
+def retention_matrix(
+    devices: np.ndarray,
+    days: np.ndarray,
+    first_day: np.ndarray,
+    first_version: np.ndarray,
+    n_versions: int,
+    retention_days=RETENTION_DAYS
+) -> List[dict]:
+    """Cohort (ilk gün, versiyon) bazında cohort büyüklüğü ve day-N geri dönen cihaz sayıları
+
+    first_day değeri -1 olan cihazlar hiçbir cohort'a dahil edilmez.
+    """
+    members = np.flatnonzero(first_day >= 0)
+    if len(members) == 0:
+        return []
+
+    base_day = int(first_day[members].min())
+    stride = max(n_versions, 1)
+    cohort_of_device = np.full(len(first_day), -1, dtype=np.int64)
+    cohort_of_device[members] = (first_day[members].astype(np.int64) - base_day) * stride + first_version[members]
+
+    cohort_keys, inverse = np.unique(cohort_of_device[members], return_inverse=True)
+    sizes = np.bincount(inverse)
+    rows = {
+        int(key): {"size": float(size), "retained": {}}
+        for key, size in zip(cohort_keys, sizes)
+    }
+
+    session_first = first_day[devices]
+    valid = session_first >= 0
+    offsets = np.where(valid, days - session_first, -1)
+    for n in retention_days:
+        retained_devices = np.unique(devices[offsets == n])
+        if len(retained_devices) == 0:
+            continue
+        keys, inverse = np.unique(cohort_of_device[retained_devices], return_inverse=True)
+        counts = np.bincount(inverse)
+        for key, count in zip(keys, counts):
+            rows[int(key)]["retained"][str(n)] = float(count)
+
+    result = []
+    for key, row in rows.items():
+        result.append({
+            "cohort_day": base_day + key // stride,
+            "version_code": key % stride,
+            "size": row["size"],
+            "retained": row["retained"],
+        })
+    return result
+
+async def _load_final_cohorts(tenant_id: str, project_id: str) -> List[dict]:
+    return await retention_cohorts_collection.find(
+        {"tenant_id": tenant_id, "project_id": project_id, "final": True},
+        {"_id": 0}
+    ).to_list(length=None)
+
+async def _load_new_devices(tenant_id: str, project_id: str, since: datetime, sessions: SessionArrays):
+    """since sonrasında ilk kez görülen cihazların ilk gün ve versiyonlarını cihaz profillerinden okur"""
+    profiles = await devices_collection.find(
+        {"tenant_id": tenant_id, "project_id": project_id, "first_seen": {"$gte": since}},
+        {"_id": 0, "device_id": 1, "first_seen": 1, "first_app_version": 1, "app_versions": 1}
+    ).to_list(length=None)
+    codes, days, versions = [], [], []
+    for profile in profiles:
+        version = profile.get("first_app_version") or (profile.get("app_versions") or [""])[0]
+        codes.append(sessions.device_code(profile["device_id"]))
+        days.append(day_index(profile["first_seen"]))
+        versions.append(sessions.version_code(version))
+    return np.array(codes, dtype=np.int32), np.array(days, dtype=np.int32), np.array(versions, dtype=np.int32)
+
+def _cohort_rows(sessions: SessionArrays, new_devices: Optional[tuple]) -> List[dict]:
+    """Cohort matrisini hesaplar (CPU yoğun, thread'de çalıştırılır)
+
+    new_devices verilirse (artımlı hesaplama) ilk görülme bilgisi cihaz profillerinden,
+    verilmezse session'lardan hesaplanır.
+    """
+    devices, days, versions = sessions.arrays()
+    n_devices = len(sessions.device_codes)
+    if new_devices is not None:
+        new_codes, new_days, new_versions = new_devices
+        first_day = np.full(n_devices, -1, dtype=np.int32)
+        first_version = np.full(n_devices, -1, dtype=np.int32)
+        first_day[new_codes] = new_days
+        first_version[new_codes] = new_versions
+    else:
+        first_day, first_version = first_seen(devices, days, versions, n_devices)
+    return retention_matrix(
+        devices, days, first_day, first_version, len(sessions.version_codes)
+    )
+
+async def compute_retention(tenant_id: str, project_id: str) -> List[dict]:
+    """Projenin retention cohort'larını hesaplar
+
+    Tüm day-N değerleri kesinleşmiş (cohort günü + 30 gün geçmiş) cohort'lar kaydedilir ve
+    sonraki hesaplamalarda tekrar hesaplanmaz; sadece son cohort'lar için session'lar okunur.
+    Artımlı hesaplama cihazların ilk görülme gününü cihaz profillerinden okur; bu yüzden
+    profilleri backfill edilmemiş (`device_profiles` işi) projelerde her seferinde tüm
+    session'lardan hesaplanır, böylece iki yol aynı sonucu verir.
+
+    Örnekleme session bazında yapıldığı için örneklenmiş cihaz kümesi tahmin edilemez;
+    örneklenmiş session'ı olan projelerde SampledProjectError fırlatılır.
+    """
+    today = day_index(datetime.utcnow())
+    project = await projects_collection.find_one(
+        {"id": project_id, "tenant_id": tenant_id},
+        {"_id": 0, "device_profiles_backfilled": 1, "has_sampled_sessions": 1, "sample_rate": 1}
+    )
+    if project and has_sampled_sessions(project):
+        raise SampledProjectError("Retention is not available for projects with sampled sessions")
+    incremental = bool(project and project.get("device_profiles_backfilled"))
+    final_rows = await _load_final_cohorts(tenant_id, project_id) if incremental else []
+
+    sessions = SessionArrays()
+    if final_rows:
+        since_day = max(day_index(row["cohort_day"]) for row in final_rows) + 1
+        since = day_from_index(since_day)
+        new_devices = await _load_new_devices(tenant_id, project_id, since, sessions)
+        await stream_sessions(tenant_id, project_id, since, sessions)
+    else:
+        new_devices = None
+        await stream_sessions(tenant_id, project_id, None, sessions)
+
+    rows = await asyncio.to_thread(_cohort_rows, sessions, new_devices)
+
+    versions_by_code = {code: version for version, code in sessions.version_codes.items()}
+    max_n = max(RETENTION_DAYS)
+    new_rows, operations = [], []
+    for row in rows:
+        cohort = {
+            "tenant_id": tenant_id,
+            "project_id": project_id,
+            "cohort_day": day_from_index(row["cohort_day"]),
+            "app_version": versions_by_code[row["version_code"]],
+            "size": row["size"],
+            "retained": row["retained"],
+            "final": row["cohort_day"] + max_n < today
+        }
+        new_rows.append(cohort)
+        if cohort["final"]:
+            operations.append(UpdateOne(
+                {
+                    "tenant_id": tenant_id,
+                    "project_id": project_id,
+                    "cohort_day": cohort["cohort_day"],
+                    "app_version": cohort["app_version"]
+                },
+                {"$set": cohort},
+                upsert=True
+            ))
+
+    if operations:
+        await retention_cohorts_collection.bulk_write(operations, ordered=False)
+
+    return format_retention(final_rows + new_rows, today)
+
+def format_retention(rows: List[dict], today: int) -> List[dict]:
+    """Cohort satırlarını oranlarla birlikte API çıktısına çevirir
+
+    Henüz olgunlaşmamış day-N değerleri (cohort günü + N bugün veya sonrası) None döner.
+    """
+    result = []
+    for row in sorted(rows, key=lambda row: (row["cohort_day"], row["app_version"])):
+        cohort_day = day_index(row["cohort_day"])
+        item = {
+            "cohort_day": row["cohort_day"].date().isoformat(),
+            "app_version": row["app_version"],
+            "size": round(row["size"])
+        }
+        for n in RETENTION_DAYS:
+            if cohort_day + n >= today:
+                item[f"day_{n}"] = None
+                continue
+            retained = row["retained"].get(str(n), 0)
+            item[f"day_{n}"] = retained / row["size"] if row["size"] else 0.0
+        result.append(item)
+    return result
+
+@job_type("retention")
+async def retention_job(job: dict):
+    """Day-N retention cohort matrisi"""
+    rows = await compute_retention(job["tenant_id"], job["project_id"])
+    app_version = job["params"].get("app_version")
+    if app_version:
+        rows = [row for row in rows if row["app_version"] == app_version]
+    return rows
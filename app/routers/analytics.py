@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.database import projects_collection, naive_utc
+from app.auth import get_current_user
+from app.retention import compute_retention
+from app.sampling import has_sampled_sessions
+from app.dwell import MAX_DWELL_RANGE_DAYS, dwell_times, summarize
+from app.screen_registry import screen_registry
+from app.trending import trending, TRENDING_WINDOWS, TRENDING_KINDS
+from typing import Optional
+from datetime import datetime, timedelta
+
+router = APIRouter()
+
+async def _get_project(project_id: str, tenant_id: str) -> dict:
+    project = await projects_collection.find_one({
+        "id": project_id,
+        "tenant_id": tenant_id
+    })
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return project
+
+@router.get("/retention")
+async def get_retention(
+    project_id: str,
+    app_version: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """İlk görülme gününe ve uygulama versiyonuna göre day-1, day-7 ve day-30 retention
+
+    Kesinleşmiş cohort'lar önbellekten okunur, sadece son 30 günün cohort'ları hesaplanır.
+    İlk hesaplama uzun sürebilir; bu durumda `retention` tipinde bir analitik iş kullanılabilir.
+    Örnekleme session bazında yapıldığından örneklenmiş session'ı olan projelerde 400 döner.
+
+    - **project_id**: Proje ID'si
+    - **app_version**: (Opsiyonel) Sadece bu versiyonla başlayan cohort'lar
+    """
+    project = await _get_project(project_id, current_user["tenant_id"])
+    if has_sampled_sessions(project):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Retention is not available for projects with sampled sessions"
+        )
+    rows = await compute_retention(current_user["tenant_id"], project_id)
+    if app_version:
+        rows = [row for row in rows if row["app_version"] == app_version]
+    return rows
+
+@router.get("/dwell_times")
+async def get_dwell_times(
+    project_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    app_version: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ekran bazında ekranda kalma sürelerinin ortalaması, medyanı ve p90 değeri (saniye)
+
+    Süreler aynı session'daki ardışık screen_view eventleri arasındaki farktan hesaplanır.
+    Kapanmış günler günlük sketch'lerden okunur, ham eventler tekrar taranmaz.
+
+    - **project_id**: Proje ID'si
+    - **start** / **end**: (Opsiyonel) Gün aralığı, varsayılan son 7 gün (en fazla 90 gün)
+    - **app_version**: (Opsiyonel) Sadece bu versiyondaki session'lar
+    """
+    project = await _get_project(project_id, current_user["tenant_id"])
+    # Timezone'lu ("...Z") sınırlar naive UTC günlerle karşılaştırılabilsin
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(days=7)
+    if start > end or (end - start).days > MAX_DWELL_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid range. start must be before end and the range cannot exceed {MAX_DWELL_RANGE_DAYS} days"
+        )
+
+    sketches = await dwell_times(current_user["tenant_id"], project_id, start, end, app_version)
+    screen_names = await screen_registry.get_tokens(project)
+    return summarize(sketches, screen_names)
+
+@router.get("/trending")
+async def get_trending(
+    project_id: str,
+    window: str = Query("5m", description="Window: '5m', '1h'"),
+    kind: str = Query("screens", description="Kind: 'screens', 'events'"),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Son 5 dakikada veya son 1 saatte en çok görüntülenen ekranlar ya da en sık eventler
+
+    Ingest sırasında güncellenen bellek içi heavy hitter sayaçlarından okunur, event koleksiyonu taranmaz.
+    Sayılar tahminidir: gerçek sayı `min_count` ile `count` arasındadır.
+
+    - **project_id**: Proje ID'si
+    - **window**: Pencere ('5m' veya '1h')
+    - **kind**: 'screens' (screen_token bazında) veya 'events' (event adı bazında)
+    - **limit**: Dönülecek kayıt sayısı
+    """
+    if window not in TRENDING_WINDOWS or kind not in TRENDING_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid window or kind. Use one of {', '.join(TRENDING_WINDOWS)} and one of {', '.join(TRENDING_KINDS)}"
+        )
+    project = await _get_project(project_id, current_user["tenant_id"])
+    result = await trending.top(current_user["tenant_id"], project_id, window, kind, limit)
+    if kind == "screens":
+        screen_names = await screen_registry.get_tokens(project)
+        for item in result["items"]:
+            item["screen_name"] = screen_names.get(item["key"])
+    return result
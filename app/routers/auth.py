@@ -8,7 +8,10 @@ from app.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_user,
     get_current_owner,
-    get_current_admin
+    get_current_admin,
+    create_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token
 )
 from app.database import (
     tenants_collection, 
@@ -25,7 +28,8 @@ from app.schemas import (
     TokenData, 
     UserRole,
     UserInvite,
-    LoginRequest
+    LoginRequest,
+    RefreshTokenRequest
 )
 import uuid
 from typing import List
@@ -73,9 +77,21 @@ async def register_tenant(tenant: TenantCreate):
     
     return tenant_data
 
+def create_user_access_token(user: dict) -> str:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return create_access_token(
+        data={
+            "sub": user["id"],
+            "tenant_id": user["tenant_id"],
+            "role": user["role"],
+            "project_permissions": user.get("project_permissions", [])
+        },
+        expires_delta=access_token_expires
+    )
+
 @router.post("/login", response_model=Token)
 async def login(login_data: LoginRequest):
-    """Kullanıcı girişi yapar ve JWT token döner"""
+    """Kullanıcı girişi yapar, JWT access token ve refresh token döner"""
     user = await users_collection.find_one({"email": login_data.email})
     if not user or not verify_password(login_data.password, user["hashed_password"]):
         raise HTTPException(
@@ -84,17 +100,25 @@ async def login(login_data: LoginRequest):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={
-            "sub": user["id"],
-            "tenant_id": user["tenant_id"],
-            "role": user["role"],
-            "project_permissions": user.get("project_permissions", [])
-        },
-        expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    access_token = create_user_access_token(user)
+    refresh_token = await create_refresh_token(user)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(refresh_request: RefreshTokenRequest):
+    """Refresh token ile şifre doğrulaması yapmadan yeni access token alır
+    
+    Her kullanımda refresh token yenilenir (rotation); eski token tekrar kullanılamaz.
+    """
+    user, refresh_token = await rotate_refresh_token(refresh_request.refresh_token)
+    access_token = create_user_access_token(user)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout")
+async def logout(refresh_request: RefreshTokenRequest):
+    """Refresh token'ı ve aynı login'den türeyen tüm refresh token'ları iptal eder"""
+    await revoke_refresh_token(refresh_request.refresh_token)
+    return {"message": "Logged out successfully"}
 
 @router.post("/invite", response_model=dict)
 async def invite_user(
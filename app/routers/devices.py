@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from app.database import devices_collection, projects_collection
+from app.schemas import DeviceProfile, DevicePage
+from app.auth import get_current_user
+from typing import Optional
+from datetime import datetime
+import re
+
+router = APIRouter()
+
+def _encode_cursor(device: dict) -> str:
+    return f"{device['last_seen'].isoformat()}|{device['device_id']}"
+
+def _decode_cursor(cursor: str):
+    try:
+        last_seen, device_id = cursor.split("|", 1)
+        return datetime.fromisoformat(last_seen), device_id
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/devices", response_model=DevicePage)
+async def list_devices(
+    project_id: str,
+    q: Optional[str] = Query(None, description="Device ID prefix"),
+    app_version: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """Projeye ait cihazları son görülme zamanına göre (yeniden eskiye) listeler
+
+    - **project_id**: Proje ID'si
+    - **q**: (Opsiyonel) Device ID'nin başlangıcı ile arama
+    - **app_version**: (Opsiyonel) Bu versiyonu kullanmış cihazlar
+    - **cursor**: (Opsiyonel) Önceki sayfanın `next_cursor` değeri
+    - **limit**: Sayfa boyutu (en fazla 200)
+    """
+    project = await projects_collection.find_one({
+        "id": project_id,
+        "tenant_id": current_user["tenant_id"]
+    })
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    query = {
+        "tenant_id": current_user["tenant_id"],
+        "project_id": project_id
+    }
+    if q:
+        query["device_id"] = {"$regex": f"^{re.escape(q)}"}
+    if app_version:
+        query["app_versions"] = app_version
+    if cursor:
+        last_seen, device_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"last_seen": {"$lt": last_seen}},
+            {"last_seen": last_seen, "device_id": {"$lt": device_id}}
+        ]
+
+    devices = await devices_collection.find(query).sort(
+        [("last_seen", -1), ("device_id", -1)]
+    ).to_list(length=limit)
+
+    next_cursor = _encode_cursor(devices[-1]) if len(devices) == limit else None
+    return {"items": devices, "next_cursor": next_cursor}
+
+@router.get("/devices/{device_id}", response_model=DeviceProfile)
+async def get_device(
+    device_id: str,
+    project_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Belirli bir cihazın profilini getirir
+
+    - **device_id**: Cihaz ID'si
+    - **project_id**: Proje ID'si
+    """
+    device = await devices_collection.find_one({
+        "tenant_id": current_user["tenant_id"],
+        "project_id": project_id,
+        "device_id": device_id
+    })
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+    return device
@@ -1,9 +1,24 @@
 # Event ile ilgili endpointler burada tanımlanacak 
 
-from fastapi import APIRouter, HTTPException, Depends, status, Header, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, Header, Query, UploadFile, File, Request, Response
 from app.database import screens_collection, events_collection, sessions_collection, projects_collection
-from app.schemas import EventTrack, ScreenCreate, ScreenResponse
-from app.auth import get_current_user, verify_project_access, verify_project_auth
+from app.schemas import EventTrack, ScreenCreate, ScreenResponse, SessionTimeline
+from app.auth import get_current_user, get_current_admin, verify_project_access, verify_project_auth
+from app.ingest import (
+    EVENT_BODY_OPENAPI,
+    EVENT_BATCH_BODY_OPENAPI,
+    read_event_payload,
+    read_batch_payload,
+    build_event_document,
+    apply_screen_policy,
+    store_events
+)
+from app.screen_registry import screen_registry, bump_screens_version
+from app.cache import query_cache, rounded_now
+from app.sampling import apply_sampling
+from app.spool import event_spool
+from app.metadata_query import build_metadata_filter, metadata_cache_key
+from app.timeline import session_timeline
 from typing import List, Optional
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
@@ -29,32 +44,36 @@ async def verify_project_access(tenant_id: str, project_id: str, bundle_id: str)
         )
     return project
 
-@router.post("/track_screen", response_model=EventTrack, dependencies=[])
+@router.post("/track_screen", response_model=EventTrack, dependencies=[], openapi_extra=EVENT_BODY_OPENAPI)
 async def track_screen(
-    event: EventTrack,
+    request: Request,
     x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
     x_project_id: str = Header(..., alias="X-Project-Id"),
     x_bundle_id: str = Header(..., alias="X-Bundle-Id")
 ):
-    """Ekran eventlerini kaydeder"""
+    """Ekran eventlerini kaydeder
+    
+    Body JSON (varsayılan) veya `Content-Type: application/msgpack` ile MessagePack olabilir.
+    """
     # Proje erişimini doğrula
-    await verify_project_auth(
+    project = await verify_project_auth(
         tenant_id=x_tenant_id,
         project_id=x_project_id,
         bundle_id=x_bundle_id
     )
     
-    event_data = event.dict()
-    event_data["tenant_id"] = x_tenant_id
-    event_data["project_id"] = x_project_id
-    event_data["bundle_id"] = x_bundle_id
-    event_data["timestamp"] = event_data.get("timestamp") or datetime.utcnow()
+    event = await read_event_payload(request)
+    event_data = build_event_document(event, x_tenant_id, x_project_id, x_bundle_id)
     
-    await events_collection.insert_one(event_data)
+    # Örnekleme dışındaki session'ların eventleri sessizce atlanır
+    if await apply_sampling(project, [event_data]):
+        await apply_screen_policy(project, [event_data])
+        await store_events([event_data])
     return event_data
 
 @router.get("/track_screen", response_model=List[EventTrack])
 async def get_track_screen_events(
+    request: Request,
     project_id: str,
     session_id: Optional[str] = None,
     time_range: Optional[str] = Query(None, description="Time range: '1d', '1w', '1m', '3m'"),
@@ -65,6 +84,7 @@ async def get_track_screen_events(
     - **project_id**: Proje ID'si
     - **session_id**: (Opsiyonel) Session ID'si. Belirtilirse sadece o session'a ait eventler listelenir
     - **time_range**: (Opsiyonel) Zaman aralığı ('1d': son 1 gün, '1w': son 1 hafta, '1m': son 1 ay, '3m': son 3 ay)
+    - **`metadata.<alan>[__op]`**: (Opsiyonel) Metadata filtresi, örn. `metadata.plan=premium` veya `metadata.level__gte=5`
     """
     # Temel sorgu
     query = {
@@ -95,50 +115,116 @@ async def get_track_screen_events(
         
         query["timestamp"] = {"$gte": time_ranges[time_range]}
     
+    query.update(await build_metadata_filter(request, current_user["tenant_id"], project_id))
     events = await events_collection.find(query).to_list(length=1000)
     return events
 
-@router.post("/events", response_model=EventTrack, dependencies=[])
+@router.post("/events", response_model=EventTrack, dependencies=[], openapi_extra=EVENT_BODY_OPENAPI)
 async def track_event(
-    event: EventTrack,
+    request: Request,
     x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
     x_project_id: str = Header(..., alias="X-Project-Id"),
     x_bundle_id: str = Header(..., alias="X-Bundle-Id")
 ):
-    """Yeni bir event kaydeder"""
+    """Yeni bir event kaydeder
+    
+    Body JSON (varsayılan) veya `Content-Type: application/msgpack` ile MessagePack olabilir.
+    """
     # Proje erişimini doğrula
-    await verify_project_auth(
+    project = await verify_project_auth(
         tenant_id=x_tenant_id,
         project_id=x_project_id,
         bundle_id=x_bundle_id
     )
     
-    event_data = event.dict()
-    event_data["tenant_id"] = x_tenant_id
-    event_data["project_id"] = x_project_id
-    event_data["bundle_id"] = x_bundle_id
-    if not event_data.get("timestamp"):
-        event_data["timestamp"] = datetime.utcnow()
+    event = await read_event_payload(request)
+    event_data = build_event_document(event, x_tenant_id, x_project_id, x_bundle_id)
     
-    await events_collection.insert_one(event_data)
+    # Örnekleme dışındaki session'ların eventleri sessizce atlanır
+    if await apply_sampling(project, [event_data]):
+        await apply_screen_policy(project, [event_data])
+        await store_events([event_data])
     return event_data
 
+@router.post("/events/batch", dependencies=[], openapi_extra=EVENT_BATCH_BODY_OPENAPI)
+async def track_events_batch(
+    request: Request,
+    x_tenant_id: str = Header(..., alias="X-Tenant-Id"),
+    x_project_id: str = Header(..., alias="X-Project-Id"),
+    x_bundle_id: str = Header(..., alias="X-Bundle-Id")
+):
+    """Birden fazla eventi tek istekte kaydeder
+    
+    Body, event listesi içeren JSON (varsayılan) veya `Content-Type: application/msgpack` ile MessagePack olabilir.
+    Tek istekte en fazla 1000 event gönderilebilir.
+    """
+    # Proje erişimini doğrula
+    project = await verify_project_auth(
+        tenant_id=x_tenant_id,
+        project_id=x_project_id,
+        bundle_id=x_bundle_id
+    )
+    
+    events = await read_batch_payload(request)
+    documents = [
+        build_event_document(event, x_tenant_id, x_project_id, x_bundle_id)
+        for event in events
+    ]
+    documents = await apply_sampling(project, documents)
+    documents = await apply_screen_policy(project, documents)
+    
+    inserted = await store_events(documents)
+    return {"received": len(events), "stored": len(inserted)}
+
+@router.get("/ingest/spool")
+async def get_ingest_spool_status(current_user: dict = Depends(get_current_admin)):
+    """Mongo kesintilerinde kullanılan yerel ingest spool'unun durumunu ve metriklerini döner
+    
+    Metrikler istek karşılayan worker'a aittir.
+    """
+    return event_spool.status()
+
 @router.get("/session_events", response_model=List[EventTrack])
 async def get_session_events(
+    request: Request,
     session_id: str,
     project_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Belirli bir session'a ait tüm eventleri listeler"""
+    """Belirli bir session'a ait tüm eventleri listeler
+    
+    `metadata.<alan>[__op]` parametreleriyle metadata'ya göre filtrelenebilir.
+    """
     events = await events_collection.find({
         "tenant_id": current_user["tenant_id"],
         "project_id": project_id,
-        "session_id": session_id
+        "session_id": session_id,
+        **await build_metadata_filter(request, current_user["tenant_id"], project_id)
     }).to_list(length=100)
     return events
 
+@router.get("/session_timeline", response_model=SessionTimeline)
+async def get_session_timeline(
+    session_id: str,
+    project_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """Session'ın eventlerini zamana göre sıralı, ekran adı ve görüntü linkiyle birlikte listeler
+    
+    - **session_id**: Session ID'si
+    - **project_id**: Proje ID'si
+    - **cursor**: (Opsiyonel) Önceki sayfanın `next_cursor` değeri
+    - **limit**: Sayfa boyutu (en fazla 1000)
+    
+    Ekran görüntüleri `screen.image_url` üzerinden ayrıca indirilir. Bitmiş session'ların timeline'ı cache'lenir.
+    """
+    return await session_timeline(current_user["tenant_id"], project_id, session_id, cursor, limit)
+
 @router.get("/time_events", response_model=List[EventTrack])
 async def get_time_based_events(
+    request: Request,
     project_id: str,
     time_range: str = Query(..., description="Time range: '1d', '1w', '1m', '3m'"),
     current_user: dict = Depends(get_current_user)
@@ -146,8 +232,11 @@ async def get_time_based_events(
     """Belirli bir zaman aralığındaki tüm eventleri listeler
     
     - **time_range**: Zaman aralığı ('1d': son 1 gün, '1w': son 1 hafta, '1m': son 1 ay, '3m': son 3 ay)
+    - **`metadata.<alan>[__op]`**: (Opsiyonel) Metadata filtresi, örn. `metadata.plan=premium` veya `metadata.level__gte=5`
+    
+    Sonuçlar birkaç saniyelik dilimler halinde cache'lenir.
     """
-    now = datetime.utcnow()
+    now = rounded_now()
     time_ranges = {
         "1d": now - timedelta(days=1),
         "1w": now - timedelta(weeks=1),
@@ -161,15 +250,26 @@ async def get_time_based_events(
             detail="Invalid time range. Use '1d', '1w', '1m', or '3m'"
         )
     
-    events = await events_collection.find({
-        "tenant_id": current_user["tenant_id"],
-        "project_id": project_id,
-        "timestamp": {"$gte": time_ranges[time_range]}
-    }).to_list(length=1000)
-    return events
+    metadata_filter = await build_metadata_filter(request, current_user["tenant_id"], project_id)
+    
+    async def load_events():
+        return await events_collection.find({
+            "tenant_id": current_user["tenant_id"],
+            "project_id": project_id,
+            "timestamp": {"$gte": time_ranges[time_range]},
+            **metadata_filter
+        }).to_list(length=1000)
+    
+    return await query_cache.get_or_load(
+        current_user["tenant_id"],
+        project_id,
+        ("time_events", time_range, now, metadata_cache_key(request)),
+        load_events
+    )
 
 @router.get("/device_events", response_model=List[EventTrack])
 async def get_device_events(
+    request: Request,
     device_id: str,
     project_id: str,
     time_range: str = Query(..., description="Time range: '1d', '1w', '1m', '3m'"),
@@ -178,6 +278,7 @@ async def get_device_events(
     """Belirli bir cihaza ait, belirli bir zaman aralığındaki tüm eventleri listeler
     
     - **time_range**: Zaman aralığı ('1d': son 1 gün, '1w': son 1 hafta, '1m': son 1 ay, '3m': son 3 ay)
+    - **`metadata.<alan>[__op]`**: (Opsiyonel) Metadata filtresi, örn. `metadata.plan=premium` veya `metadata.level__gte=5`
     """
     now = datetime.utcnow()
     time_ranges = {
@@ -207,10 +308,45 @@ async def get_device_events(
         "tenant_id": current_user["tenant_id"],
         "project_id": project_id,
         "session_id": {"$in": session_ids},
-        "timestamp": {"$gte": time_ranges[time_range]}
+        "timestamp": {"$gte": time_ranges[time_range]},
+        **await build_metadata_filter(request, current_user["tenant_id"], project_id)
     }).to_list(length=1000)
     return events
 
+def _image_media_type(content: bytes) -> str:
+    if content.startswith(b"\x89PNG"):
+        return "image/png"
+    if content.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if content.startswith(b"RIFF") and content[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+@router.get("/screens/{screen_id}/image")
+async def get_screen_image(
+    screen_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ekranın görüntüsünü döner
+    
+    Ekran görüntüleri değişmediği için tarayıcı tarafından cache'lenebilir.
+    """
+    screen = await screens_collection.find_one(
+        {"id": screen_id, "tenant_id": current_user["tenant_id"]},
+        {"_id": 0, "image": 1}
+    )
+    if not screen or not screen.get("image"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Screen not found"
+        )
+    content = base64.b64decode(screen["image"])
+    return Response(
+        content=content,
+        media_type=_image_media_type(content),
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
 async def generate_unique_token(tenant_id: str, project_id: str):
     """6 haneli benzersiz bir token oluşturur (harf ve sayı karışık)
     
@@ -277,6 +413,10 @@ async def create_screen_token(
     
     await screens_collection.insert_one(screen_data)
     
+    # Token kaydını güncelle, diğer worker'lar versiyon damgasından değişikliği görür
+    version = await bump_screens_version(current_user["tenant_id"], project_id)
+    screen_registry.add(current_user["tenant_id"], project_id, screen_token, name, version)
+    
     return {
         "token": screen_token,
         "name": name,
@@ -0,0 +1,158 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from app.database import projects_collection, export_jobs_collection, naive_utc
+from app.schemas import ExportFormat, ExportJobCreate, ExportJob
+from app.auth import get_current_user
+from app.export import (
+    MEDIA_TYPES,
+    EXPORT_JOB_STALE_SECONDS,
+    parquet_available,
+    build_export_query,
+    stream_export,
+    start_export_job
+)
+from typing import Optional
+from datetime import datetime, timedelta
+import uuid
+import os
+
+router = APIRouter()
+
+async def _validate_export(tenant_id: str, project_id: str, start: datetime, end: datetime, export_format: ExportFormat):
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if export_format == ExportFormat.PARQUET and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parquet export is not available on this server"
+        )
+    project = await projects_collection.find_one({
+        "id": project_id,
+        "tenant_id": tenant_id
+    })
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+@router.get("/export/events")
+async def export_events(
+    project_id: str,
+    start: datetime,
+    end: Optional[datetime] = None,
+    event_name: Optional[str] = None,
+    format: ExportFormat = Query(ExportFormat.CSV),
+    current_user: dict = Depends(get_current_user)
+):
+    """Projeye ait eventleri seçilen formatta stream ederek indirir
+
+    Satır sınırı yoktur, eventler veritabanından parça parça okunup gönderilir.
+    Çok büyük exportlar için `/api/export/jobs` ile arka plan işi tercih edilmelidir.
+
+    - **project_id**: Proje ID'si
+    - **start** / **end**: Zaman aralığı (end verilmezse şu an)
+    - **event_name**: (Opsiyonel) Sadece bu isimdeki eventler
+    - **format**: csv, ndjson veya parquet
+    """
+    # Timezone'lu parametreler veritabanındaki naive UTC zamanlarla karşılaştırılabilsin
+    start = naive_utc(start)
+    end = naive_utc(end) if end else datetime.utcnow()
+    await _validate_export(current_user["tenant_id"], project_id, start, end, format)
+
+    query = build_export_query(current_user["tenant_id"], project_id, start, end, event_name)
+    filename = f"events-{project_id}-{start:%Y%m%d}-{end:%Y%m%d}.{format.value}"
+    return StreamingResponse(
+        stream_export(query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/export/jobs", response_model=ExportJob)
+async def create_export_job(
+    job: ExportJobCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Arka planda çalışan, kaldığı yerden devam edebilen bir export işi başlatır"""
+    start = naive_utc(job.start)
+    end = naive_utc(job.end) if job.end else datetime.utcnow()
+    await _validate_export(current_user["tenant_id"], job.project_id, start, end, job.format)
+
+    job_data = {
+        "id": str(uuid.uuid4()),
+        "tenant_id": current_user["tenant_id"],
+        "project_id": job.project_id,
+        "start": start,
+        "end": end,
+        "event_name": job.event_name,
+        "format": job.format,
+        "status": "pending",
+        "rows": 0,
+        "bytes_written": 0,
+        "created_by": current_user["id"],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    await export_jobs_collection.insert_one(job_data)
+    start_export_job(job_data["id"])
+    return job_data
+
+async def _get_job(job_id: str, tenant_id: str) -> dict:
+    job = await export_jobs_collection.find_one({"id": job_id, "tenant_id": tenant_id})
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+    return job
+
+@router.get("/export/jobs/{job_id}", response_model=ExportJob)
+async def get_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Export işinin durumunu getirir"""
+    job = await _get_job(job_id, current_user["tenant_id"])
+
+    # Çalıştıran worker düşmüşse iş bu worker'da devam ettirilir
+    stale_before = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    if job["status"] == "running" and job.get("heartbeat_at") and job["heartbeat_at"] < stale_before:
+        start_export_job(job_id)
+    return job
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Tamamlanmış export işinin dosyasını indirir"""
+    job = await _get_job(job_id, current_user["tenant_id"])
+    if job["status"] != "completed" or not os.path.exists(job.get("file_path", "")):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Export job is not completed"
+        )
+    export_format = ExportFormat(job["format"])
+    return FileResponse(
+        job["file_path"],
+        media_type=MEDIA_TYPES[export_format],
+        filename=f"events-{job['project_id']}-{job_id}.{export_format.value}"
+    )
+
+@router.delete("/export/jobs/{job_id}", response_model=ExportJob)
+async def cancel_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Bekleyen veya çalışan export işini iptal eder"""
+    job = await _get_job(job_id, current_user["tenant_id"])
+    if job["status"] in ("pending", "running"):
+        await export_jobs_collection.update_one(
+            {"id": job_id, "status": {"$in": ["pending", "running"]}},
+            {"$set": {"status": "cancelled", "updated_at": datetime.utcnow()}}
+        )
+        job["status"] = "cancelled"
+    return job
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.database import projects_collection, jobs_collection
+from app.schemas import JobCreate, Job, UserRole
+from app.auth import get_current_user
+from app.jobs import JOB_TYPES, ADMIN_JOB_TYPES, job_runner, create_job
+from typing import List
+
+router = APIRouter()
+
+@router.post("/jobs", response_model=Job)
+async def submit_job(
+    job: JobCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Arka planda çalışacak bir analitik iş oluşturur
+
+    Aynı parametrelerle çalışan veya yakın zamanda tamamlanmış bir iş varsa yeni iş
+    oluşturulmaz, mevcut iş döner.
+
+    - **type**: İş tipi (event_breakdown, screen_breakdown, screen_flows, ...)
+    - **project_id**: Proje ID'si
+    - **params**: İş parametreleri (ör. start, end)
+    """
+    if job.type not in JOB_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job type. Use one of: {', '.join(sorted(JOB_TYPES))}"
+        )
+    if job.type in ADMIN_JOB_TYPES and current_user["role"] not in [UserRole.OWNER, UserRole.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    project = await projects_collection.find_one({
+        "id": job.project_id,
+        "tenant_id": current_user["tenant_id"]
+    })
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    return await create_job(job.type, current_user["tenant_id"], job.project_id, job.params, current_user["id"])
+
+async def _get_job(job_id: str, tenant_id: str, with_result: bool = False) -> dict:
+    projection = None if with_result else {"result": 0}
+    job = await jobs_collection.find_one({"id": job_id, "tenant_id": tenant_id}, projection)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.get("/jobs", response_model=List[Job])
+async def list_jobs(
+    project_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Projeye ait son analitik işleri listeler"""
+    jobs = await jobs_collection.find(
+        {"tenant_id": current_user["tenant_id"], "project_id": project_id},
+        {"result": 0}
+    ).sort("created_at", -1).to_list(length=100)
+    return jobs
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Analitik işin durumunu getirir"""
+    return await _get_job(job_id, current_user["tenant_id"])
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Tamamlanmış analitik işin sonucunu getirir"""
+    job = await _get_job(job_id, current_user["tenant_id"], with_result=True)
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is {job['status']}"
+        )
+    return {"id": job["id"], "type": job["type"], "completed_at": job["completed_at"], "result": job["result"]}
+
+@router.delete("/jobs/{job_id}", response_model=Job)
+async def cancel_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Bekleyen veya çalışan analitik işi iptal eder"""
+    await _get_job(job_id, current_user["tenant_id"])
+    await job_runner.cancel(job_id)
+    return await _get_job(job_id, current_user["tenant_id"])
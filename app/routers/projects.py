@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.database import projects_collection, tenants_collection
-from app.schemas import ProjectCreate, Project
+from app.schemas import ProjectCreate, Project, ProjectSampling, MetadataIndexCreate, ProjectOverview, Job
 from app.auth import get_current_user, get_current_admin
+from app.metadata_query import validate_field, within_metadata_quota
+from app.jobs import create_job
+from app.project_stats import projects_overview
+from app.cache import query_cache
+from pymongo import ReturnDocument
 from datetime import datetime
 import uuid
 
@@ -32,6 +37,12 @@ async def create_project(
         "platform": project.platform,
         "bundle_id": project.bundle_id,
         "description": project.description,
+        "unknown_screen_policy": project.unknown_screen_policy,
+        "sample_rate": project.sample_rate,
+        # Örneklenmiş session'ı olan projelerde ingest session'ın kendi oranına bakar
+        "has_sampled_sessions": project.sample_rate < 1,
+        # Yeni projede session yok, cihaz profilleri baştan tam tutulur
+        "device_profiles_backfilled": True,
         "is_active": True,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
@@ -47,6 +58,22 @@ async def list_projects(current_user: dict = Depends(get_current_user)):
     ).to_list(length=100)
     return projects
 
+@router.get("/overview", response_model=list[ProjectOverview])
+async def get_projects_overview(current_user: dict = Depends(get_current_user)):
+    """Tenant'ın tüm projelerini özet istatistikleriyle birlikte tek istekte listeler
+
+    Her proje için son 24 saat ve 7 gündeki session ve event sayıları, son event zamanı ve
+    aktif cihaz sayıları döner. Session ve event sayıları örnekleme oranına göre ölçeklenmiş
+    tahminlerdir ve saat çözünürlüğündedir. Aktif cihaz sayıları ölçeklenmez; örneklenmiş
+    projelerde sadece örneklenen session'ları olan cihazları sayar. Sonuç birkaç saniye cache'lenir.
+    """
+    return await query_cache.get_or_load(
+        current_user["tenant_id"],
+        None,
+        ("projects_overview",),
+        lambda: projects_overview(current_user["tenant_id"])
+    )
+
 @router.get("/{project_id}", response_model=Project)
 async def get_project(
     project_id: str,
@@ -61,4 +88,80 @@ async def get_project(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
-    return project 
\ No newline at end of file
+    return project
+
+@router.put("/{project_id}/sampling", response_model=Project)
+async def update_project_sampling(
+    project_id: str,
+    sampling: ProjectSampling,
+    current_user: dict = Depends(get_current_admin)
+):
+    """Projenin ingest örnekleme oranını günceller
+
+    Karar session_id'ye göre verilir; bir session'ın eventleri ya tamamen tutulur ya tamamen atılır.
+    Oran değişikliği sadece yeni session'ları etkiler, mevcut session'lar kendi oranıyla devam eder.
+    Analitik endpoint'ler sayıları örnekleme oranına göre ölçekler; retention örneklenmiş
+    projelerde hesaplanmaz.
+    """
+    update = {"sample_rate": sampling.sample_rate, "updated_at": datetime.utcnow()}
+    if sampling.sample_rate < 1:
+        update["has_sampled_sessions"] = True
+    project = await projects_collection.find_one_and_update(
+        {"id": project_id, "tenant_id": current_user["tenant_id"]},
+        {"$set": update},
+        return_document=ReturnDocument.AFTER
+    )
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return project
+
+@router.post("/{project_id}/metadata_indexes", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def promote_metadata_field(
+    project_id: str,
+    body: MetadataIndexCreate,
+    current_user: dict = Depends(get_current_admin)
+):
+    """Bir metadata alanını index'li alan olarak işaretler
+
+    Alan için (tenant_id, project_id, metadata.<alan>, timestamp) partial index'i oluşturulur.
+    Index'li alanlar event endpoint'lerinde `metadata.<alan>` filtresiyle proje büyüklüğünden
+    bağımsız olarak sorgulanabilir.
+
+    Index oluşturma büyük koleksiyonlarda uzun sürdüğü için `metadata_index` tipinde bir iş
+    olarak çalışır ve 202 ile iş döner; durum `GET /api/jobs/{job_id}` ile izlenir. İş
+    tamamlanınca alan projenin `indexed_metadata_fields` listesine eklenir. Tenant başına en
+    fazla METADATA_MAX_PROMOTED_FIELDS farklı alan promote edilebilir.
+    """
+    field = validate_field(body.field)
+    project = await projects_collection.find_one({"id": project_id, "tenant_id": current_user["tenant_id"]})
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    if not await within_metadata_quota(current_user["tenant_id"], field):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Maximum number of indexed metadata fields reached for this tenant"
+        )
+
+    if field not in project.get("indexed_metadata_fields", []):
+        # Kota hesabında index'i oluşturulmakta olan alanlar da sayılır
+        await projects_collection.update_one(
+            {"id": project_id, "tenant_id": current_user["tenant_id"]},
+            {"$addToSet": {"pending_metadata_fields": field}}
+        )
+    job = await create_job(
+        "metadata_index", current_user["tenant_id"], project_id, {"field": field}, current_user["id"]
+    )
+    if job["status"] == "completed":
+        # Önceki iş zaten tamamlanmış, bu istekteki işaret kalmasın
+        await projects_collection.update_one(
+            {"id": project_id, "tenant_id": current_user["tenant_id"]},
+            {"$pull": {"pending_metadata_fields": field}}
+        )
+    return job
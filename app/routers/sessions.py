@@ -2,6 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
 from app.database import sessions_collection, tenants_collection, projects_collection
 from app.schemas import SessionCreate, Session
 from app.auth import get_current_user, verify_project_auth
+from app.devices import record_session
+from app.project_stats import record_session_stats
+from app.cache import query_cache, rounded_now
+from app.sampling import sample_rate_of, is_sampled, session_rates, record_unsampled_session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import uuid
@@ -29,7 +33,7 @@ async def create_session(
     - **X-Bundle-Id**: Bundle ID
     """
     # Proje erişimini doğrula
-    await verify_project_auth(
+    project = await verify_project_auth(
         tenant_id=x_tenant_id,
         project_id=x_project_id,
         bundle_id=x_bundle_id
@@ -43,8 +47,19 @@ async def create_session(
     session_data["created_at"] = datetime.utcnow()
     session_data["expires_at"] = datetime.utcnow() + timedelta(hours=24)
     session_data["is_active"] = True
+    session_data["sample_rate"] = sample_rate_of(project)
+    
+    # Örnekleme dışında kalan session'lar kaydedilmez, SDK yine de session id alır;
+    # eventleri proje oranı değişse de atılabilsin diye sadece işaretlenir
+    if not is_sampled(session_data["id"], session_data["sample_rate"]):
+        await record_unsampled_session(session_data)
+        return session_data
     
     await sessions_collection.insert_one(session_data)
+    session_rates.remember(x_tenant_id, x_project_id, session_data["id"], session_data["sample_rate"])
+    await record_session(session_data)
+    await record_session_stats(session_data)
+    query_cache.note_ingest(x_tenant_id, x_project_id)
     return session_data
 
 @router.get("/sessions", response_model=List[Session])
@@ -60,6 +75,8 @@ async def get_tenant_sessions(
     - **tenant_id**: Path'te belirtilen tenant ID (JWT token'daki tenant_id ile eşleşmeli)
     - **project_id**: Sessionları filtrelemek için proje ID
     
+    Her session, event sayısı, süre ve ziyaret edilen ekranları içeren `summary` alanıyla döner.
+    
     Not: Tenant ID JWT token'dan alınır, header'da istenmez.
     """
     
@@ -75,13 +92,19 @@ async def get_tenant_sessions(
             detail="Project not found or not accessible"
         )
     
-    # Sessionları getir
-    sessions = await sessions_collection.find({
-        "tenant_id": current_user["tenant_id"],
-        "project_id": project_id
-    }).to_list(length=100)
-    
-    return sessions 
+    # Sessionları getir (özetler session dokümanında tutulduğu için tek sorgu yeterli)
+    async def load_sessions():
+        return await sessions_collection.find({
+            "tenant_id": current_user["tenant_id"],
+            "project_id": project_id
+        }).sort("created_at", -1).to_list(length=100)
+    
+    return await query_cache.get_or_load(
+        current_user["tenant_id"],
+        project_id,
+        ("sessions",),
+        load_sessions
+    )
 
 @router.get("/sessions/{session_id}", response_model=Session)
 async def get_session(
@@ -126,6 +149,8 @@ async def get_device_sessions(
     - **device_id**: Sessionları filtrelemek için cihaz ID
     - **project_id**: Sessionları filtrelemek için proje ID
     
+    Cihazın özet bilgileri için `/api/devices/{device_id}` kullanılabilir.
+    
     Not: Tenant ID JWT token'dan alınır, header'da istenmez.
     """
     sessions = await sessions_collection.find({
@@ -149,9 +174,11 @@ async def get_time_based_sessions(
     - **project_id**: Sessionları filtrelemek için proje ID
     - **time_range**: Zaman aralığı ('1d': son 1 gün, '1w': son 1 hafta, '1m': son 1 ay, '3m': son 3 ay)
     
+    Sonuçlar birkaç saniyelik dilimler halinde cache'lenir.
+    
     Not: Tenant ID JWT token'dan alınır, header'da istenmez.
     """
-    now = datetime.utcnow()
+    now = rounded_now()
     time_ranges = {
         "1d": now - timedelta(days=1),
         "1w": now - timedelta(weeks=1),
@@ -178,10 +205,16 @@ async def get_time_based_sessions(
         )
     
     # Sessionları getir
-    sessions = await sessions_collection.find({
-        "tenant_id": current_user["tenant_id"],
-        "project_id": project_id,
-        "created_at": {"$gte": time_ranges[time_range]}
-    }).to_list(length=1000)
-    
-    return sessions
\ No newline at end of file
+    async def load_sessions():
+        return await sessions_collection.find({
+            "tenant_id": current_user["tenant_id"],
+            "project_id": project_id,
+            "created_at": {"$gte": time_ranges[time_range]}
+        }).to_list(length=1000)
+    
+    return await query_cache.get_or_load(
+        current_user["tenant_id"],
+        project_id,
+        ("time_sessions", time_range, now),
+        load_sessions
+    )
\ No newline at end of file
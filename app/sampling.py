@@ -0,0 +1,138 @@
+from app.database import sessions_collection, unsampled_sessions_collection, mongo_health
+from pymongo.errors import ConnectionFailure
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import os
+
+# Worker başına önbellekte tutulacak session örnekleme oranı sayısı
+SESSION_RATE_CACHE_SIZE = int(os.getenv("SESSION_RATE_CACHE_SIZE", "100000"))
+# Örnekleme dışında kalan session işaretlerinin ömrü (session süresiyle aynı)
+UNSAMPLED_SESSION_TTL = timedelta(hours=24)
+
+# Örnekleme dışında kalan session'lar önbellekte bu oranla tutulur
+DROPPED = 0.0
+
+def sample_rate_of(project: dict) -> float:
+    return float(project.get("sample_rate") or 1.0)
+
+def has_sampled_sessions(project: dict) -> bool:
+    """Projede örnekleme dışı bırakılmış session olabilir mi
+
+    Bayrağı olmayan eski projelerde sadece güncel orana bakılır.
+    """
+    return bool(project.get("has_sampled_sessions")) or sample_rate_of(project) < 1.0
+
+def is_sampled(session_id: str, rate: float) -> bool:
+    """Session'ın örnekleme dahilinde olup olmadığını session_id'nin hash'ine göre belirler
+
+    Karar deterministiktir; aynı session'ın tüm eventleri ya tamamen tutulur ya tamamen atılır.
+    """
+    if rate >= 1.0:
+        return True
+    digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 < rate
+
+class SessionRates:
+    """Session'ların oluşturulduklarında kaydedilen örnekleme oranları (worker bazlı LRU)
+
+    Proje oranı sonradan değişse de bir session'ın eventleri session'ın kendi oranıyla
+    tutulur veya atılır. Önbellekte olmayan session'lar tek sorguda session'lardan,
+    bulunamayanlar örnekleme dışı session işaretlerinden okunur.
+    """
+
+    def __init__(self, max_size: int = SESSION_RATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._rates: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+
+    def remember(self, tenant_id: str, project_id: str, session_id: str, rate: float):
+        key = (tenant_id, project_id, session_id)
+        self._rates[key] = rate
+        self._rates.move_to_end(key)
+        while len(self._rates) > self.max_size:
+            self._rates.popitem(last=False)
+
+    async def _load(self, tenant_id: str, project_id: str, session_ids: List[str]) -> Dict[str, float]:
+        query = {"tenant_id": tenant_id, "project_id": project_id, "id": {"$in": session_ids}}
+        found = {
+            session["id"]: float(session.get("sample_rate") or 1.0)
+            async for session in sessions_collection.find(query, {"_id": 0, "id": 1, "sample_rate": 1})
+        }
+        missing = [session_id for session_id in session_ids if session_id not in found]
+        if missing:
+            query["id"] = {"$in": missing}
+            async for session in unsampled_sessions_collection.find(query, {"_id": 0, "id": 1}):
+                found[session["id"]] = DROPPED
+        return found
+
+    async def get_many(self, tenant_id: str, project_id: str, session_ids: Iterable[str]) -> Dict[str, Optional[float]]:
+        """Session id'lerinin kayıtlı oranlarını döner, bilinmeyenler için None
+
+        Mongo erişilemezse bilinmeyen session'lar None döner (proje oranına düşülür).
+        """
+        rates, missing = {}, []
+        for session_id in set(session_ids):
+            key = (tenant_id, project_id, session_id)
+            rate = self._rates.get(key)
+            if rate is None:
+                missing.append(session_id)
+            else:
+                self._rates.move_to_end(key)
+                rates[session_id] = rate
+
+        if missing and mongo_health.healthy:
+            try:
+                loaded = await self._load(tenant_id, project_id, missing)
+            except ConnectionFailure:
+                mongo_health.mark_unhealthy()
+                loaded = {}
+            for session_id, rate in loaded.items():
+                self.remember(tenant_id, project_id, session_id, rate)
+            rates.update(loaded)
+        return rates
+
+async def record_unsampled_session(session: dict):
+    """Örnekleme dışında kalan session'ı işaretler, böylece eventleri oran değişse de atılır"""
+    session_rates.remember(session["tenant_id"], session["project_id"], session["id"], DROPPED)
+    await unsampled_sessions_collection.insert_one({
+        "id": session["id"],
+        "tenant_id": session["tenant_id"],
+        "project_id": session["project_id"],
+        "expires_at": datetime.utcnow() + UNSAMPLED_SESSION_TTL
+    })
+
+async def apply_sampling(project: dict, documents: List[dict]) -> List[dict]:
+    """Örnekleme dışındaki session'ların eventlerini eler, kalanlara örnekleme oranını yazar
+
+    Karar session oluşturulurken kaydedilen oranla verilir. Hiç örnekleme yapılmamış
+    projelerde session'lara bakılmaz; kaydı bulunamayan session'lar (süresi dolmuş veya
+    bilinmeyen) projenin güncel oranıyla değerlendirilir.
+    """
+    project_rate = sample_rate_of(project)
+    if not documents or (not has_sampled_sessions(project)):
+        for document in documents:
+            document["sample_rate"] = project_rate
+        return documents
+
+    rates = await session_rates.get_many(
+        project["tenant_id"], project["id"], (document["session_id"] for document in documents)
+    )
+    sampled = []
+    for document in documents:
+        rate = rates.get(document["session_id"])
+        if rate is None:
+            rate = project_rate if is_sampled(document["session_id"], project_rate) else DROPPED
+        if rate != DROPPED:
+            document["sample_rate"] = rate
+            sampled.append(document)
+    return sampled
+
+# Aggregation pipeline'larında örneklenmiş veriden tahmini toplam sayıyı hesaplayan ifade
+WEIGHTED_COUNT = {"$sum": {"$divide": [1, {"$ifNull": ["$sample_rate", 1]}]}}
+
+def weight_of(document: dict) -> float:
+    """Dokümanın temsil ettiği tahmini kayıt sayısı (1 / örnekleme oranı)"""
+    return 1.0 / (document.get("sample_rate") or 1.0)
+
+session_rates = SessionRates()
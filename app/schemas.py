@@ -1,5 +1,5 @@
 # Pydantic şemaları burada tanımlanacak 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator, computed_field
 from typing import Optional, Dict, List
 from datetime import datetime
 import uuid
@@ -17,6 +17,12 @@ class Platform(str, Enum):
     IOS = "ios"
     ANDROID = "android"
 
+# Bilinmeyen screen token politikası
+class UnknownScreenPolicy(str, Enum):
+    ACCEPT = "accept"  # Kontrol yapılmaz
+    TAG = "tag"  # Event kaydedilir, screen_known=False ile işaretlenir
+    REJECT = "reject"  # Event reddedilir
+
 # Login formu
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -26,6 +32,10 @@ class LoginRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     tenant_id: Optional[str] = None
@@ -66,13 +76,23 @@ class ProjectBase(BaseModel):
     platform: Platform
     bundle_id: str
     description: Optional[str] = None
+    unknown_screen_policy: UnknownScreenPolicy = UnknownScreenPolicy.TAG
+    sample_rate: float = Field(1.0, gt=0, le=1)  # Tutulacak session oranı
 
 class ProjectCreate(ProjectBase):
     pass
 
+class ProjectSampling(BaseModel):
+    sample_rate: float = Field(..., gt=0, le=1)
+
+class MetadataIndexCreate(BaseModel):
+    field: str  # metadata altındaki alan yolu, örn. "plan"
+
 class Project(ProjectBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tenant_id: str
+    indexed_metadata_fields: List[str] = []
+    pending_metadata_fields: List[str] = []  # Index'i oluşturulmakta olan alanlar
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -80,6 +100,20 @@ class Project(ProjectBase):
     class Config:
         from_attributes = True
 
+# Proje listesi için son 24 saat / 7 gün özetleri
+class ProjectStats(BaseModel):
+    sessions_24h: int = 0
+    sessions_7d: int = 0
+    events_24h: int = 0
+    events_7d: int = 0
+    last_event_at: Optional[datetime] = None
+    # Cihaz sayıları örnekleme oranına göre ölçeklenmez (örneklenmiş session'ı olan cihazlar)
+    active_devices_24h: int = Field(0, description="Devices seen in the last 24 hours; not scaled by sample rate")
+    active_devices_7d: int = Field(0, description="Devices seen in the last 7 days; not scaled by sample rate")
+
+class ProjectOverview(Project):
+    stats: ProjectStats
+
 # Tenant modelleri
 class TenantBase(BaseModel):
     name: str
@@ -107,6 +141,29 @@ class SessionBase(BaseModel):
 class SessionCreate(SessionBase):
     pass
 
+# Ingest sırasında güncellenen session özeti
+class SessionSummary(BaseModel):
+    event_count: int = 0
+    first_event_at: Optional[datetime] = None
+    last_event_at: Optional[datetime] = None
+    screens: List[str] = []
+    last_screen: Optional[str] = None
+
+    @field_validator("last_screen", mode="before")
+    @classmethod
+    def extract_last_screen(cls, value):
+        # Veritabanında {at, screen_token} olarak tutulur
+        if isinstance(value, dict):
+            return value.get("screen_token")
+        return value
+
+    @computed_field
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.first_event_at is None or self.last_event_at is None:
+            return None
+        return (self.last_event_at - self.first_event_at).total_seconds()
+
 class Session(SessionBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tenant_id: str
@@ -115,6 +172,24 @@ class Session(SessionBase):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     expires_at: datetime
     is_active: bool = True
+    sample_rate: float = 1.0
+    summary: Optional[SessionSummary] = None
+
+# Cihaz profili modelleri
+class DeviceProfile(BaseModel):
+    device_id: str
+    project_id: str
+    first_seen: datetime
+    last_seen: datetime
+    session_count: int
+    first_app_version: Optional[str] = None
+    last_app_version: Optional[str] = None
+    app_versions: List[str] = []
+    last_session_id: Optional[str] = None
+
+class DevicePage(BaseModel):
+    items: List[DeviceProfile]
+    next_cursor: Optional[str] = None
 
 # Event modelleri
 class EventTrack(BaseModel):
@@ -123,6 +198,68 @@ class EventTrack(BaseModel):
     event_name: str
     timestamp: Optional[datetime] = None
     metadata: Optional[Dict] = None
+    event_id: Optional[str] = None  # Client tarafından üretilen id, tekrar gönderimleri ayıklamak için
+
+# Session timeline modelleri
+class TimelineScreen(BaseModel):
+    id: str
+    name: str
+    image_url: str  # Ekran görüntüsü ayrı endpoint'ten indirilir
+
+class TimelineEvent(EventTrack):
+    screen: Optional[TimelineScreen] = None
+
+class SessionTimeline(BaseModel):
+    session_id: str
+    ended: bool
+    items: List[TimelineEvent]
+    next_cursor: Optional[str] = None
+
+# Export modelleri
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+class ExportJobCreate(BaseModel):
+    project_id: str
+    start: datetime
+    end: Optional[datetime] = None
+    event_name: Optional[str] = None
+    format: ExportFormat = ExportFormat.CSV
+
+class ExportJob(BaseModel):
+    id: str
+    project_id: str
+    start: datetime
+    end: datetime
+    event_name: Optional[str] = None
+    format: ExportFormat
+    status: str  # pending, running, completed, failed, cancelled
+    rows: int = 0
+    bytes_written: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
+
+# Analitik iş modelleri
+class JobCreate(BaseModel):
+    type: str
+    project_id: str
+    params: Dict = {}
+
+class Job(BaseModel):
+    id: str
+    type: str
+    project_id: str
+    params: Dict = {}
+    status: str  # pending, running, completed, failed, cancelled
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
 class InvitationToken(BaseModel):
     token: str
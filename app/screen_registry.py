@@ -0,0 +1,73 @@
+from app.database import screens_collection, projects_collection
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+import asyncio
+
+class ScreenRegistry:
+    """Proje bazlı geçerli screen token'larının bellekteki kaydı
+
+    Token listesi ilk ihtiyaçta veritabanından yüklenir. Proje dokümanındaki
+    `screens_version` alanı worker'lar arası versiyon damgası olarak kullanılır:
+    ingest sırasında zaten okunan proje dokümanındaki versiyon bellektekinden farklıysa
+    liste yeniden yüklenir, böylece ek bir veritabanı isteği yapılmaz.
+    """
+
+    def __init__(self):
+        self._entries: Dict[tuple, dict] = {}
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+
+    async def get_tokens(self, project: dict) -> Dict[str, str]:
+        """Projenin token -> ekran adı eşlemesini döner"""
+        key = (project["tenant_id"], project["id"])
+        version = project.get("screens_version", 0)
+        entry = self._entries.get(key)
+        if entry is not None and entry["version"] >= version:
+            return entry["tokens"]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["version"] >= version:
+                return entry["tokens"]
+
+            screens = await screens_collection.find(
+                {"tenant_id": key[0], "project_id": key[1]},
+                {"_id": 0, "token": 1, "name": 1}
+            ).to_list(length=None)
+            tokens = {screen["token"]: screen["name"] for screen in screens}
+            self._entries[key] = {"version": version, "tokens": tokens}
+            return tokens
+
+    async def is_known(self, project: dict, token: str) -> bool:
+        return token in await self.get_tokens(project)
+
+    async def screen_name(self, project: dict, token: str) -> Optional[str]:
+        return (await self.get_tokens(project)).get(token)
+
+    def add(self, tenant_id: str, project_id: str, token: str, name: str, version: int):
+        """Yeni oluşturulan token'ı kayda ekler ve versiyonu günceller"""
+        key = (tenant_id, project_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if entry["version"] == version - 1:
+            entry["tokens"][token] = name
+            entry["version"] = version
+        else:
+            # Başka worker'larda da değişiklik olmuş, bir sonraki okumada tamamen yüklensin
+            del self._entries[key]
+
+    def invalidate(self, tenant_id: str, project_id: str):
+        self._entries.pop((tenant_id, project_id), None)
+
+async def bump_screens_version(tenant_id: str, project_id: str) -> int:
+    """Projenin screen versiyon damgasını artırır ve yeni değeri döner"""
+    project = await projects_collection.find_one_and_update(
+        {"id": project_id, "tenant_id": tenant_id},
+        {"$inc": {"screens_version": 1}},
+        projection={"screens_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return project["screens_version"] if project else 0
+
+screen_registry = ScreenRegistry()
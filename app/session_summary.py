@@ -0,0 +1,52 @@
+from app.database import sessions_collection
+from pymongo import UpdateOne
+from typing import Dict, List
+
+def _group_by_session(documents: List[dict]) -> Dict[tuple, List[dict]]:
+    groups = {}
+    for document in documents:
+        key = (document["tenant_id"], document["project_id"], document["session_id"])
+        groups.setdefault(key, []).append(document)
+    return groups
+
+def summary_update(events: List[dict]) -> dict:
+    """Bir session'a ait eventlerden session özetini güncelleyen update dokümanını üretir
+
+    Özet sessions dokümanının `summary` alanında tutulur:
+    - **event_count**: Toplam event sayısı
+    - **first_event_at** / **last_event_at**: İlk ve son event zamanı
+    - **screens**: Ziyaret edilen farklı ekranların token'ları
+    - **last_screen**: Son görüntülenen ekran ({at, screen_token}, $max ile zamana göre seçilir)
+    """
+    timestamps = [event["timestamp"] for event in events]
+    update = {
+        "$inc": {"summary.event_count": len(events)},
+        "$min": {"summary.first_event_at": min(timestamps)},
+        "$max": {"summary.last_event_at": max(timestamps)},
+    }
+
+    screen_views = [event for event in events if event["event_name"] == "screen_view"]
+    if screen_views:
+        last_view = max(screen_views, key=lambda event: event["timestamp"])
+        update["$addToSet"] = {
+            "summary.screens": {"$each": list({event["screen_token"] for event in screen_views})}
+        }
+        # Alan sırası önemli: $max önce "at" alanını karşılaştırır
+        update["$max"]["summary.last_screen"] = {
+            "at": last_view["timestamp"],
+            "screen_token": last_view["screen_token"],
+        }
+    return update
+
+async def update_session_summaries(documents: List[dict]):
+    """Eklenen eventlere göre session özetlerini tek bir bulk write ile günceller"""
+    if not documents:
+        return
+    operations = [
+        UpdateOne(
+            {"id": session_id, "tenant_id": tenant_id, "project_id": project_id},
+            summary_update(events)
+        )
+        for (tenant_id, project_id, session_id), events in _group_by_session(documents).items()
+    ]
+    await sessions_collection.bulk_write(operations, ordered=False)
@@ -0,0 +1,335 @@
+from app.database import mongo_health
+from pymongo.errors import ConnectionFailure
+from typing import Awaitable, Callable, Dict, Iterator, List
+import asyncio
+import bson
+import fcntl
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+
+# Spool ayarları
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/tmp/screen-tracker-spool")
+SPOOL_SEGMENT_MAX_BYTES = int(os.getenv("SPOOL_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "true").lower() == "true"
+SPOOL_PROBE_INTERVAL = float(os.getenv("SPOOL_PROBE_INTERVAL", "2"))
+SPOOL_REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", "500"))
+# Replay hatalarında bekleme süresinin üst sınırı ve segmentin karantinaya alınacağı deneme sayısı
+SPOOL_MAX_BACKOFF = float(os.getenv("SPOOL_MAX_BACKOFF", "60"))
+SPOOL_MAX_SEGMENT_FAILURES = int(os.getenv("SPOOL_MAX_SEGMENT_FAILURES", "3"))
+
+# Kayıt başlığı: payload uzunluğu ve CRC32
+RECORD_HEADER = struct.Struct(">II")
+SEGMENT_SUFFIX = ".spool"
+# Replay edilemeyen segmentlerin taşındığı dizin (spool kökünde, replay edilmez)
+QUARANTINE_DIR = "quarantine"
+QUARANTINE_SUFFIX = ".quarantined"
+
+logger = logging.getLogger(__name__)
+
+class SpoolFull(Exception):
+    pass
+
+def read_segment(path: str, metrics: dict) -> Iterator[dict]:
+    """Segmentteki kayıtları sırayla okur
+
+    Checksum'ı tutmayan kayıt atlanıp okumaya devam edilir; yarım kalmış (crash anında
+    yazılan) kayıtta okuma durur. Atlanan kayıtlar metrics["corrupt_records"]'a eklenir.
+    """
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                metrics["corrupt_records"] += 1
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                metrics["corrupt_records"] += 1
+                return
+            if zlib.crc32(payload) != checksum:
+                metrics["corrupt_records"] += 1
+                continue
+            try:
+                document = bson.decode(payload)
+            except bson.errors.BSONError:
+                metrics["corrupt_records"] += 1
+                continue
+            yield document
+
+class EventSpool:
+    """Mongo erişilemezken kabul edilen eventler için diskte append-only, segmentli spool
+
+    Her worker kendi dizinine yazar ve dizini kilitler. Kilidi bırakılmış (sahibi ölmüş)
+    dizinler de replay sırasında devralınır. Kayıtlar [uzunluk][crc32][bson] formatındadır.
+    Bozuk kayıt içeren veya tekrar tekrar replay edilemeyen segmentler silinmez,
+    karantina dizinine taşınır.
+
+    Disk kullanımı her append'de dizin taranmadan, yazılan ve silinen segmentlerle güncellenen
+    bir sayaçla kontrol edilir; sayaç arka plan görevinde diskten (diğer worker'ların
+    yazdıklarıyla birlikte) yeniden hesaplanır.
+    """
+
+    def __init__(self, root: str = SPOOL_DIR):
+        self.root = root
+        self.directory = None
+        self._lock_file = None
+        self._segment = None
+        self._segment_path = None
+        self._segment_size = 0
+        self._sequence = 0
+        self._disk_bytes = 0
+        self._failures: Dict[str, int] = {}
+        self._replay_lock = asyncio.Lock()
+        # Yazmalar thread'de yapıldığından segment dosyası thread kilidiyle korunur
+        self._write_lock = threading.Lock()
+        self.metrics = {
+            "spooled_events": 0,
+            "replayed_events": 0,
+            "duplicate_events": 0,
+            "rejected_events": 0,
+            "corrupt_records": 0,
+            "quarantined_segments": 0,
+        }
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.directory = os.path.join(self.root, f"worker-{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "lock"), "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        existing = self._segments(self.directory)
+        if existing:
+            self._sequence = int(os.path.basename(existing[-1])[:-len(SEGMENT_SUFFIX)])
+        self._disk_bytes = self.disk_usage()
+
+    @staticmethod
+    def _segments(directory: str) -> List[str]:
+        return sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def disk_usage(self) -> int:
+        """Spool kökündeki tüm segmentlerin toplam boyutu (dizini tarar)"""
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except FileNotFoundError:
+                    # Tarama sırasında replay edilip silinmiş
+                    continue
+        return total
+
+    def _rotate(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._sequence += 1
+        path = os.path.join(self.directory, f"{self._sequence:012d}{SEGMENT_SUFFIX}")
+        self._segment = open(path, "ab")
+        self._segment_path = path
+        self._segment_size = 0
+
+    def _write(self, data: bytes, count: int):
+        with self._write_lock:
+            if self.directory is None:
+                self.open()
+            if self._disk_bytes + len(data) > SPOOL_MAX_BYTES:
+                self.metrics["rejected_events"] += count
+                raise SpoolFull()
+            if self._segment is None or self._segment_size + len(data) > SPOOL_SEGMENT_MAX_BYTES:
+                self._rotate()
+            self._segment.write(data)
+            self._segment.flush()
+            if SPOOL_FSYNC:
+                os.fsync(self._segment.fileno())
+            self._segment_size += len(data)
+            self._disk_bytes += len(data)
+            self.metrics["spooled_events"] += count
+
+    def _replay_snapshot(self) -> List[str]:
+        """Aktif segmenti kapatıp replay edilecek segmentleri listeler
+
+        Yazmalarla yarışmaması için yazma kilidi altında yapılır; sonradan açılan segmentler
+        listede yer almaz.
+        """
+        with self._write_lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+                self._segment_path = None
+            return self.pending_segments()
+
+    async def append(self, documents: List[dict]):
+        """Eventleri aktif segmente yazar, disk sınırı aşılacaksa SpoolFull fırlatır
+
+        Yazma ve fsync event loop'u bloklamamak için thread'de yapılır.
+        """
+        records = []
+        for document in documents:
+            payload = bson.encode(document)
+            records.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        await asyncio.to_thread(self._write, b"".join(records), len(documents))
+
+    def pending_segments(self) -> List[str]:
+        """Replay edilecek segmentler (kendi dizini ve sahipsiz dizinler)"""
+        if self.directory is None or not os.path.isdir(self.root):
+            return []
+        segments = []
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if name == QUARANTINE_DIR or not os.path.isdir(directory):
+                continue
+            if directory != self.directory and not self._try_adopt(directory):
+                continue
+            segments.extend(self._segments(directory))
+        return segments
+
+    @staticmethod
+    def _try_adopt(directory: str) -> bool:
+        """Sahibi çalışmayan worker dizinini devralır (kilit alınabiliyorsa)"""
+        lock_path = os.path.join(directory, "lock")
+        try:
+            lock_file = open(lock_path, "a")
+        except OSError:
+            return False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.close()
+        return True
+
+    def _remove(self, path: str):
+        size = os.path.getsize(path)
+        os.remove(path)
+        self._disk_bytes = max(self._disk_bytes - size, 0)
+        self._failures.pop(path, None)
+
+    def _quarantine(self, path: str, reason: str):
+        """Segmenti silmeden karantina dizinine taşır"""
+        size = os.path.getsize(path)
+        quarantine = os.path.join(self.root, QUARANTINE_DIR)
+        os.makedirs(quarantine, exist_ok=True)
+        target = os.path.join(
+            quarantine,
+            f"{os.path.basename(os.path.dirname(path))}-{os.path.basename(path)}{QUARANTINE_SUFFIX}"
+        )
+        os.replace(path, target)
+        self._disk_bytes = max(self._disk_bytes - size, 0)
+        self._failures.pop(path, None)
+        self.metrics["quarantined_segments"] += 1
+        logger.warning("Spool segment %s quarantined as %s: %s", path, target, reason)
+
+    async def _replay_segment(self, path: str, insert_batch):
+        corrupt_before = self.metrics["corrupt_records"]
+        batch = []
+        for document in read_segment(path, self.metrics):
+            batch.append(document)
+            if len(batch) >= SPOOL_REPLAY_BATCH:
+                await self._replay_batch(batch, insert_batch)
+                batch = []
+        if batch:
+            await self._replay_batch(batch, insert_batch)
+
+        skipped = self.metrics["corrupt_records"] - corrupt_before
+        if skipped:
+            self._quarantine(path, f"{skipped} corrupt record(s) skipped")
+        else:
+            self._remove(path)
+
+    async def replay(self, insert_batch: Callable[[List[dict]], Awaitable[int]]):
+        """Biriken segmentleri sırayla Mongo'ya yazar, tamamlanan segmenti siler
+
+        insert_batch eklenen yeni event sayısını döner. Eventlerin _id'si spool'a yazılmadan
+        önce atandığı için yarıda kalan bir segmentin tekrar okunması kopya oluşturmaz.
+        Bozuk kayıtları atlanan segmentler sağlam kayıtları yazıldıktan sonra karantinaya alınır.
+        Bağlantı dışı bir hatayla SPOOL_MAX_SEGMENT_FAILURES kez replay edilemeyen segment de
+        karantinaya alınır, böylece sonraki segmentleri bloklamaz.
+        """
+        async with self._replay_lock:
+            # Yeni gelen eventler yeni segmente yazılsın
+            segments = await asyncio.to_thread(self._replay_snapshot)
+
+            for path in segments:
+                if path == self._segment_path:
+                    # Yazılmakta olan segment bir sonraki replay'de okunur
+                    continue
+                try:
+                    await self._replay_segment(path, insert_batch)
+                except FileNotFoundError:
+                    # Başka bir worker aynı sahipsiz segmenti replay etmiş
+                    continue
+                except ConnectionFailure:
+                    raise
+                except Exception as e:
+                    failures = self._failures[path] = self._failures.get(path, 0) + 1
+                    if failures < SPOOL_MAX_SEGMENT_FAILURES:
+                        raise
+                    self._quarantine(path, f"replay failed {failures} times: {e!r}")
+
+            # Devralınan ve boşalan dizinleri temizle
+            for name in os.listdir(self.root):
+                directory = os.path.join(self.root, name)
+                if (
+                    name != QUARANTINE_DIR
+                    and directory != self.directory
+                    and os.path.isdir(directory)
+                    and not self._segments(directory)
+                    and self._try_adopt(directory)
+                ):
+                    shutil.rmtree(directory, ignore_errors=True)
+
+    async def _replay_batch(self, batch: List[dict], insert_batch):
+        inserted = await insert_batch(batch)
+        self.metrics["replayed_events"] += inserted
+        self.metrics["duplicate_events"] += len(batch) - inserted
+
+    async def run(self, insert_batch: Callable[[List[dict]], Awaitable[int]]):
+        """Arka plan görevi: Mongo tekrar erişilebilir olunca spool'u replay eder
+
+        Beklenmeyen hatalar loglanır ve bekleme süresi SPOOL_MAX_BACKOFF'a kadar katlanarak
+        tekrar denenir; görev hiçbir hatada sonlanmaz.
+        """
+        with self._write_lock:
+            if self.directory is None:
+                self.open()
+        delay = SPOOL_PROBE_INTERVAL
+        while True:
+            try:
+                self._disk_bytes = await asyncio.to_thread(self.disk_usage)
+                if self.pending_segments() or not mongo_health.healthy:
+                    if await mongo_health.ping():
+                        mongo_health.mark_healthy()
+                        await self.replay(insert_batch)
+                delay = SPOOL_PROBE_INTERVAL
+            except ConnectionFailure:
+                mongo_health.mark_unhealthy()
+                delay = SPOOL_PROBE_INTERVAL
+            except Exception:
+                delay = min(delay * 2, SPOOL_MAX_BACKOFF)
+                logger.exception("Spool replay failed, retrying in %.0f seconds", delay)
+            await asyncio.sleep(delay)
+
+    def status(self) -> dict:
+        return {
+            "mongo_healthy": mongo_health.healthy,
+            "unhealthy_since": mongo_health.unhealthy_since,
+            "pending_segments": len(self.pending_segments()),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": SPOOL_MAX_BYTES,
+            **self.metrics,
+        }
+
+event_spool = EventSpool()
@@ -0,0 +1,109 @@
+from fastapi import HTTPException, status
+from app.database import events_collection, sessions_collection
+from app.cache import query_cache
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from typing import List, Optional
+import os
+
+# Session timeline ayarları
+# Bu süre boyunca event gelmeyen session bitmiş sayılır
+SESSION_IDLE_TIMEOUT_MINUTES = int(os.getenv("SESSION_IDLE_TIMEOUT_MINUTES", "30"))
+SESSION_TIMELINE_CACHE_TTL = float(os.getenv("SESSION_TIMELINE_CACHE_TTL", "600"))
+
+def encode_cursor(event: dict) -> str:
+    return f"{event['timestamp'].isoformat()}|{event['_id']}"
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, event_id = cursor.split("|", 1)
+        return datetime.fromisoformat(timestamp), ObjectId(event_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def session_ended(session: dict, now: datetime) -> bool:
+    """Session süresi dolmuşsa veya uzun süredir event almıyorsa bitmiş sayılır"""
+    if not session.get("is_active", True) or session["expires_at"] <= now:
+        return True
+    last_event_at = (session.get("summary") or {}).get("last_event_at")
+    return last_event_at is not None and last_event_at < now - timedelta(minutes=SESSION_IDLE_TIMEOUT_MINUTES)
+
+def timeline_pipeline(tenant_id: str, project_id: str, session_id: str, cursor: Optional[str], limit: int) -> List[dict]:
+    """Session eventlerini zamana göre sıralayıp ekran adı ve görüntü linkiyle birleştiren pipeline
+
+    Ekran görüntüsü (base64) pipeline'dan çıkarılır, sadece indirme linki döner.
+    """
+    match = {"tenant_id": tenant_id, "project_id": project_id, "session_id": session_id}
+    if cursor:
+        timestamp, event_id = decode_cursor(cursor)
+        match["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$gt": event_id}}
+        ]
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": 1, "_id": 1}},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "screens",
+            "localField": "screen_token",
+            "foreignField": "token",
+            "pipeline": [
+                {"$match": {"tenant_id": tenant_id, "project_id": project_id}},
+                {"$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "name": 1,
+                    "image_url": {"$concat": ["/api/screens/", "$id", "/image"]}
+                }},
+                {"$limit": 1}
+            ],
+            "as": "screen"
+        }},
+        {"$set": {"screen": {"$first": "$screen"}}}
+    ]
+
+async def session_timeline(tenant_id: str, project_id: str, session_id: str, cursor: Optional[str], limit: int) -> dict:
+    """Session'ın sıralı ve sayfalı timeline'ını döner
+
+    Bitmiş session'ların sayfaları uzun süre cache'lenir. Cache anahtarında session'ın
+    event sayısı olduğu için sonradan gelen (ör. spool'dan replay edilen) eventler
+    yeni bir anahtar üretir.
+    """
+    session = await sessions_collection.find_one(
+        {"id": session_id, "tenant_id": tenant_id, "project_id": project_id},
+        {"_id": 0, "expires_at": 1, "is_active": 1, "summary.event_count": 1, "summary.last_event_at": 1}
+    )
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    ended = session_ended(session, datetime.utcnow())
+
+    async def load_page():
+        events = await events_collection.aggregate(
+            timeline_pipeline(tenant_id, project_id, session_id, cursor, limit)
+        ).to_list(length=limit)
+        return {
+            "session_id": session_id,
+            "ended": ended,
+            "items": events,
+            "next_cursor": encode_cursor(events[-1]) if len(events) == limit else None
+        }
+
+    if not ended:
+        return await load_page()
+
+    event_count = (session.get("summary") or {}).get("event_count", 0)
+    return await query_cache.get_or_load(
+        tenant_id,
+        project_id,
+        ("session_timeline", session_id, cursor, limit, event_count),
+        load_page,
+        ttl=SESSION_TIMELINE_CACHE_TTL
+    )
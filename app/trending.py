@@ -0,0 +1,256 @@
+from app.database import trending_snapshots_collection, mongo_health
+from app.sampling import weight_of
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Tuple
+import asyncio
+import os
+import socket
+import time
+
+# Trending ayarları
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "100"))  # Kova başına sayaç sayısı
+TRENDING_MAX_PROJECTS = int(os.getenv("TRENDING_MAX_PROJECTS", "1000"))
+TRENDING_FLUSH_INTERVAL = float(os.getenv("TRENDING_FLUSH_INTERVAL", "5"))
+# Pencere adı -> (pencere uzunluğu saniye, kova sayısı)
+TRENDING_WINDOWS = {"5m": (300, 10), "1h": (3600, 12)}
+TRENDING_KINDS = ("screens", "events")
+
+EPOCH = datetime(1970, 1, 1)
+
+Counters = Dict[str, list]
+
+class SpaceSaving:
+    """Sabit kapasiteli Space-Saving heavy hitter sayacı
+
+    Kapasite dolunca en küçük sayaç yeni anahtara devredilir ve eski değeri hata olarak tutulur.
+    Her anahtarın gerçek (ağırlıklı) sayısı [sayı - hata, sayı] aralığındadır; listede olmayan
+    bir anahtarın sayısı en fazla floor() kadardır.
+    """
+
+    def __init__(self, capacity: int = TRENDING_CAPACITY):
+        self.capacity = capacity
+        self.counters: Counters = {}
+
+    def add(self, key: str, weight: float = 1.0):
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0.0]
+            return
+        victim = min(self.counters, key=lambda name: self.counters[name][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[key] = [floor + weight, floor]
+
+    def floor(self) -> float:
+        if len(self.counters) < self.capacity:
+            return 0.0
+        return min(counter[0] for counter in self.counters.values())
+
+def merge_counters(parts: List[Tuple[Counters, float]], capacity: int = TRENDING_CAPACITY) -> Tuple[Counters, float]:
+    """(sayaçlar, floor) özetlerini birleştirir
+
+    Bir özette olmayan anahtar için o özetin floor değeri hem sayıya hem hataya eklenir, böylece
+    sayı üst sınır olarak kalır. Sonuç en büyük `capacity` sayaca kırpılır; kırpılan anahtarlar
+    da floor'a yansıtılır.
+    """
+    floor = sum(part_floor for _, part_floor in parts)
+    merged: Counters = {}
+    for counters, part_floor in parts:
+        for key, (count, error) in counters.items():
+            counter = merged.get(key)
+            if counter is None:
+                counter = merged[key] = [floor, floor]
+            counter[0] += count - part_floor
+            counter[1] += error - part_floor
+
+    if len(merged) > capacity:
+        ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)
+        floor = max(floor, ranked[capacity][1][0])
+        merged = dict(ranked[:capacity])
+    return merged, floor
+
+def oldest_bucket(window: str, now: float) -> int:
+    length, count = TRENDING_WINDOWS[window]
+    return int(now // (length / count)) - count + 1
+
+class ProjectTrending:
+    """Bir projenin pencere başına kovalara bölünmüş Space-Saving sayaçları
+
+    Kayan pencere kova çözünürlüğündedir (5m için 30 sn, 1h için 5 dk). Bellek kullanımı
+    pencere ve kova sayısıyla sınırlıdır.
+    """
+
+    def __init__(self):
+        # pencere -> kova indeksi -> tür -> sayaç
+        self.buckets: Dict[str, Dict[int, Dict[str, SpaceSaving]]] = {window: {} for window in TRENDING_WINDOWS}
+
+    def add(self, kind: str, key: str, at: float, now: float, weight: float):
+        for window, (length, count) in TRENDING_WINDOWS.items():
+            if now - at >= length:
+                continue
+            size = length / count
+            index = int(at // size)
+            buckets = self.buckets[window]
+            bucket = buckets.get(index)
+            if bucket is None:
+                self._prune(window, now)
+                bucket = buckets[index] = {name: SpaceSaving() for name in TRENDING_KINDS}
+            bucket[kind].add(key, weight)
+
+    def _prune(self, window: str, now: float):
+        oldest = oldest_bucket(window, now)
+        buckets = self.buckets[window]
+        for index in [index for index in buckets if index < oldest]:
+            del buckets[index]
+
+    def parts(self, window: str, kind: str, now: float) -> List[Tuple[Counters, float]]:
+        self._prune(window, now)
+        return [
+            (bucket[kind].counters, bucket[kind].floor())
+            for bucket in self.buckets[window].values()
+        ]
+
+    def to_snapshot(self, now: float) -> dict:
+        windows = {}
+        for window in TRENDING_WINDOWS:
+            self._prune(window, now)
+            windows[window] = [
+                {
+                    "index": index,
+                    **{
+                        kind: {
+                            "counters": [[key, count, error] for key, (count, error) in bucket[kind].counters.items()],
+                            "floor": bucket[kind].floor(),
+                        }
+                        for kind in TRENDING_KINDS
+                    }
+                }
+                for index, bucket in self.buckets[window].items()
+            ]
+        return windows
+
+    def is_empty(self, now: float) -> bool:
+        for window in TRENDING_WINDOWS:
+            self._prune(window, now)
+            if self.buckets[window]:
+                return False
+        return True
+
+class TrendingTracker:
+    """Ingest edilen eventlerden proje bazında anlık en popüler ekran ve eventleri tutar
+
+    Sayaçlar worker belleğindedir. Her worker değişen projelerin kovalarını birkaç saniyede bir
+    trending_snapshots koleksiyonuna yazar; sorgu kendi kovalarını diğer worker'ların pencere
+    içindeki kovalarıyla birleştirir. Kapanan worker'ların kovaları zamanla pencereden çıkar.
+    """
+
+    def __init__(self, max_projects: int = TRENDING_MAX_PROJECTS):
+        self.max_projects = max_projects
+        self.worker_id = None
+        self._projects: "OrderedDict[tuple, ProjectTrending]" = OrderedDict()
+        self._dirty = set()
+
+    def record(self, documents: List[dict]):
+        now = time.time()
+        for document in documents:
+            key = (document["tenant_id"], document["project_id"])
+            project = self._projects.get(key)
+            if project is None:
+                project = self._projects[key] = ProjectTrending()
+                while len(self._projects) > self.max_projects:
+                    evicted, _ = self._projects.popitem(last=False)
+                    self._dirty.discard(evicted)
+            else:
+                self._projects.move_to_end(key)
+            self._dirty.add(key)
+
+            at = min((document["timestamp"] - EPOCH).total_seconds(), now)
+            weight = weight_of(document)
+            project.add("events", document["event_name"], at, now, weight)
+            if document["event_name"] == "screen_view" and document.get("screen_token"):
+                project.add("screens", document["screen_token"], at, now, weight)
+
+    async def top(self, tenant_id: str, project_id: str, window: str, kind: str, limit: int) -> dict:
+        """Penceredeki en sık K anahtarı tahmini sayı ve hata sınırıyla döner
+
+        `count` üst sınırdır, gerçek sayı en az `min_count` kadardır. Listede olmayan
+        anahtarların sayısı `max_unlisted_count` değerini geçmez.
+        """
+        now = time.time()
+        project = self._projects.get((tenant_id, project_id))
+        parts = project.parts(window, kind, now) if project is not None else []
+
+        if mongo_health.healthy:
+            oldest = oldest_bucket(window, now)
+            snapshots = await trending_snapshots_collection.find(
+                {"tenant_id": tenant_id, "project_id": project_id, "worker_id": {"$ne": self.worker_id}},
+                {"_id": 0, f"windows.{window}": 1}
+            ).to_list(length=None)
+            for snapshot in snapshots:
+                for bucket in snapshot["windows"][window]:
+                    if bucket["index"] < oldest:
+                        continue
+                    summary = bucket[kind]
+                    parts.append((
+                        {key: [count, error] for key, count, error in summary["counters"]},
+                        summary["floor"]
+                    ))
+
+        counters, floor = merge_counters(parts)
+        ranked = sorted(counters.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return {
+            "window": window,
+            "kind": kind,
+            "max_unlisted_count": round(floor),
+            "items": [
+                {"key": key, "count": round(count), "error": round(error), "min_count": round(count - error)}
+                for key, (count, error) in ranked
+            ],
+        }
+
+    async def flush(self):
+        """Son flush'tan beri değişen projelerin kovalarını snapshot koleksiyonuna yazar"""
+        now = time.time()
+        updated_at = datetime.utcnow()
+        dirty, self._dirty = self._dirty, set()
+        operations = []
+        for key in dirty:
+            project = self._projects.get(key)
+            if project is None:
+                continue
+            tenant_id, project_id = key
+            operations.append(UpdateOne(
+                {"worker_id": self.worker_id, "tenant_id": tenant_id, "project_id": project_id},
+                {"$set": {"windows": project.to_snapshot(now), "updated_at": updated_at}},
+                upsert=True
+            ))
+        try:
+            if operations:
+                await trending_snapshots_collection.bulk_write(operations, ordered=False)
+        except PyMongoError:
+            self._dirty |= dirty
+            raise
+
+        # Penceresi tamamen boşalan projeler bellekten çıkarılır
+        for key in [key for key, project in self._projects.items() if project.is_empty(now)]:
+            del self._projects[key]
+
+    async def run(self):
+        """Arka plan görevi: snapshot'ları periyodik olarak yazar"""
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        while True:
+            await asyncio.sleep(TRENDING_FLUSH_INTERVAL)
+            if not mongo_health.healthy:
+                continue
+            try:
+                await self.flush()
+            except PyMongoError:
+                # Bir sonraki turda tekrar denenir
+                pass
+
+trending = TrendingTracker()
@@ -0,0 +1,91 @@
+"""JSON ve MessagePack ingest yollarının tek çekirdekte saniyedeki event sayısını karşılaştırır
+
+Kullanım:
+    python -m benchmarks.ingest_formats [--events 100000] [--batch-size 100]
+
+Sadece parse + doğrulama maliyeti ölçülür, veritabanı yazımı dahil değildir.
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+from pydantic import TypeAdapter
+from typing import List
+
+from app.ingest import validate_event
+from app.schemas import EventTrack
+
+_event_list_adapter = TypeAdapter(List[EventTrack])
+
+def make_events(count: int) -> list:
+    start = datetime.utcnow()
+    session_id = str(uuid.uuid4())
+    return [
+        {
+            "screen_token": "A1B2C3",
+            "session_id": session_id,
+            "event_name": "screen_view" if i % 3 else "button_tap",
+            "timestamp": start + timedelta(milliseconds=i),
+            "metadata": {"plan": "premium", "index": i, "source": "benchmark"},
+        }
+        for i in range(count)
+    ]
+
+def bench(label: str, payloads: list, decode, events_per_payload: int):
+    started = time.perf_counter()
+    for payload in payloads:
+        decode(payload)
+    elapsed = time.perf_counter() - started
+    total = len(payloads) * events_per_payload
+    size = sum(len(payload) for payload in payloads) / total
+    print(f"{label:<22} {total / elapsed:>12,.0f} events/s   {size:>6.1f} bytes/event")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    json_events = [
+        json.dumps({**event, "timestamp": event["timestamp"].isoformat()}).encode()
+        for event in events
+    ]
+    msgpack_events = [msgpack.packb(event, datetime=True) for event in _as_utc(events)]
+
+    batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+    json_batches = [
+        json.dumps([{**event, "timestamp": event["timestamp"].isoformat()} for event in batch]).encode()
+        for batch in batches
+    ]
+    msgpack_batches = [msgpack.packb(_as_utc(batch), datetime=True) for batch in batches]
+
+    bench("json single", json_events, lambda body: EventTrack.model_validate_json(body).model_dump(), 1)
+    bench(
+        "msgpack single",
+        msgpack_events,
+        lambda body: validate_event(msgpack.unpackb(body, raw=False, timestamp=3)),
+        1,
+    )
+    bench(
+        "json batch",
+        json_batches,
+        lambda body: [event.model_dump() for event in _event_list_adapter.validate_json(body)],
+        args.batch_size,
+    )
+    bench(
+        "msgpack batch",
+        msgpack_batches,
+        lambda body: [validate_event(raw) for raw in msgpack.unpackb(body, raw=False, timestamp=3)],
+        args.batch_size,
+    )
+
+def _as_utc(events: list) -> list:
+    # msgpack timestamp eklentisi timezone bilgisi olan datetime ister
+    return [{**event, "timestamp": event["timestamp"].replace(tzinfo=timezone.utc)} for event in events]
+
+if __name__ == "__main__":
+    main()
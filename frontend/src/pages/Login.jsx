@@ -31,6 +31,7 @@ function Login() {
     try {
       const response = await api.post('/api/auth/login', formData);
       localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
       navigate('/');
     } catch (err) {
       setError('Giriş başarısız. Lütfen bilgilerinizi kontrol edin.');
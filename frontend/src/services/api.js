@@ -21,12 +21,44 @@ api.interceptors.request.use(
   }
 );
 
-// Response interceptor - hata durumunda token'ı temizle
+// Aynı anda gelen 401'lerde tek bir refresh isteği yapılır
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = axios
+      .post(`${api.defaults.baseURL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
+// Response interceptor - token süresi dolmuşsa refresh token ile yenile, olmazsa token'ları temizle
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const originalRequest = error.config;
     if (error.response?.status === 401) {
+      if (!originalRequest._retry && localStorage.getItem('refresh_token')) {
+        originalRequest._retry = true;
+        try {
+          const token = await refreshAccessToken();
+          originalRequest.headers.Authorization = `Bearer ${token}`;
+          return api(originalRequest);
+        } catch (refreshError) {
+          // Refresh başarısız, tekrar giriş gerekli
+        }
+      }
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       window.location.href = '/login';
     }
     return Promise.reject(error);
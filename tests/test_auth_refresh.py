@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+from app.auth import create_refresh_token, hash_refresh_token, revoke_refresh_token, rotate_refresh_token
+
+USER = {"id": "u1", "tenant_id": "t1"}
+
+
+def _matches(document, query):
+    for key, expected in query.items():
+        value = document.get(key)
+        if isinstance(expected, dict):
+            if "$gt" in expected and not (value is not None and value > expected["$gt"]):
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class FakeRefreshTokens:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def find_one(self, query):
+        for document in self.documents:
+            if _matches(document, query):
+                return dict(document)
+        return None
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update["$set"])
+                return dict(document)
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        for document in self.documents:
+            if _matches(document, query):
+                return
+        if upsert:
+            self.documents.append({**query, **update["$setOnInsert"]})
+
+    async def update_many(self, query, update):
+        for document in self.documents:
+            if _matches(document, query):
+                document.update(update["$set"])
+
+
+class FakeUsers:
+    async def find_one(self, query):
+        return dict(USER) if query.get("id") == USER["id"] else None
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    collection = FakeRefreshTokens()
+    monkeypatch.setattr(auth, "refresh_tokens_collection", collection)
+    monkeypatch.setattr(auth, "users_collection", FakeUsers())
+    return collection
+
+
+def _stored(tokens, token):
+    return next(d for d in tokens.documents if d["token_hash"] == hash_refresh_token(token))
+
+
+def _rotate(token):
+    return asyncio.run(rotate_refresh_token(token))
+
+
+def _age_rotation(tokens, token, seconds):
+    document = _stored(tokens, token)
+    document["revoked_at"] -= timedelta(seconds=seconds)
+
+
+def test_rotation_issues_new_token_in_same_family(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    user, new_token = _rotate(token)
+    assert user["id"] == "u1"
+    assert new_token != token
+    old, new = _stored(tokens, token), _stored(tokens, new_token)
+    assert old["revoked"] and old["successor_hash"] == hash_refresh_token(new_token)
+    assert not new["revoked"]
+    assert new["family_id"] == old["family_id"]
+
+
+def test_reuse_within_grace_returns_same_successor(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    _, first = _rotate(token)
+    _, second = _rotate(token)
+    assert second == first
+    assert len(tokens.documents) == 2
+    assert not _stored(tokens, first)["revoked"]
+
+
+def test_reuse_after_grace_revokes_family(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    _, new_token = _rotate(token)
+    _age_rotation(tokens, token, auth.REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1)
+    with pytest.raises(HTTPException) as exc:
+        _rotate(token)
+    assert exc.value.status_code == 401
+    assert _stored(tokens, new_token)["revoked"]
+
+
+def test_reuse_after_successor_was_used_revokes_family(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    _, second = _rotate(token)
+    _, third = _rotate(second)
+    with pytest.raises(HTTPException):
+        _rotate(token)
+    assert _stored(tokens, third)["revoked"]
+
+
+def test_revoked_family_is_not_within_grace(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    asyncio.run(revoke_refresh_token(token))
+    with pytest.raises(HTTPException):
+        _rotate(token)
+
+
+def test_expired_and_unknown_tokens_are_rejected(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    _stored(tokens, token)["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+    with pytest.raises(HTTPException):
+        _rotate(token)
+    with pytest.raises(HTTPException):
+        _rotate("unknown")
+
+
+def test_successor_is_created_when_parallel_request_has_not_stored_it(tokens):
+    token = asyncio.run(create_refresh_token(USER))
+    _, new_token = _rotate(token)
+    # İlk istek yeni token'ı kaydetmeden önce ikinci istek gelmiş gibi
+    tokens.documents.remove(_stored(tokens, new_token))
+    _, again = _rotate(token)
+    assert again == new_token
+    assert not _stored(tokens, new_token)["revoked"]
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from app.cache import QueryCache
+
+
+def test_concurrent_misses_load_once():
+    cache = QueryCache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("t1", "p1", "key", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert calls == 1
+
+
+def test_cached_value_expires():
+    cache = QueryCache(ttl=0)
+    values = iter([1, 2])
+
+    async def loader():
+        return next(values)
+
+    async def run():
+        first = await cache.get_or_load("t1", "p1", "key", loader)
+        second = await cache.get_or_load("t1", "p1", "key", loader)
+        return first, second
+
+    assert asyncio.run(run()) == (1, 2)
+
+
+def test_waiter_reloads_when_leader_is_cancelled():
+    cache = QueryCache()
+    calls = 0
+    started = None
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            started.set()
+            await asyncio.sleep(10)
+        return "loaded"
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        leader = asyncio.create_task(cache.get_or_load("t1", "p1", "key", loader))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_load("t1", "p1", "key", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(run()) == "loaded"
+    assert calls == 2
+
+
+def test_loader_error_reaches_waiters_and_is_not_cached():
+    cache = QueryCache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_load("t1", "p1", "key", loader) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == 1
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_load("t1", "p1", "key", loader))
+
+
+def test_invalidate_project_only_affects_that_project():
+    cache = QueryCache()
+    counter = 0
+
+    async def loader():
+        nonlocal counter
+        counter += 1
+        return counter
+
+    async def get(project_id):
+        return await cache.get_or_load("t1", project_id, "key", loader)
+
+    assert asyncio.run(get("p1")) == 1
+    assert asyncio.run(get("p2")) == 2
+    cache.invalidate_project("t1", "p1")
+    assert asyncio.run(get("p1")) == 3
+    assert asyncio.run(get("p2")) == 2
+
+
+def test_evicted_project_generation_does_not_resurrect_entries():
+    cache = QueryCache(max_projects=1)
+    counter = 0
+
+    async def loader():
+        nonlocal counter
+        counter += 1
+        return counter
+
+    async def get(project_id):
+        return await cache.get_or_load("t1", project_id, "key", loader)
+
+    assert asyncio.run(get("p1")) == 1
+    cache.invalidate_project("t1", "p1")
+    cache.invalidate_project("t1", "p2")
+    # p1 generation kaydından düştü, eski (generation'sız) kaydı görmemeli
+    assert asyncio.run(get("p1")) == 2
+    assert len(cache._generations) == 1
+
+
+def test_note_ingest_invalidates_small_projects_only(monkeypatch):
+    import app.cache as cache_module
+
+    monkeypatch.setattr(cache_module, "SMALL_PROJECT_EVENTS_PER_MINUTE", 10)
+    cache = QueryCache()
+    counter = 0
+
+    async def loader():
+        nonlocal counter
+        counter += 1
+        return counter
+
+    async def get():
+        return await cache.get_or_load("t1", "p1", "key", loader)
+
+    assert asyncio.run(get()) == 1
+    cache.note_ingest("t1", "p1", 5)
+    assert asyncio.run(get()) == 2
+    cache.note_ingest("t1", "p1", 50)
+    assert asyncio.run(get()) == 2
+
+
+def test_entries_are_bounded():
+    cache = QueryCache(max_entries=2)
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await cache.get_or_load("t1", "p1", key, lambda key=key: asyncio.sleep(0, key))
+
+    asyncio.run(run())
+    assert len(cache._entries) == 2
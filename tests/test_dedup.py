@@ -0,0 +1,51 @@
+from app.dedup import DigestTable, RecentEventIds, event_key, key_digest, split_duplicates
+import app.dedup as dedup
+
+
+def _key(event_id):
+    return ("t1", "p1", event_id)
+
+
+def test_digest_table_membership():
+    table = DigestTable(100)
+    digests = [key_digest(_key(str(i))) for i in range(100)]
+    for digest in digests:
+        table.add(digest)
+    table.add(digests[0])
+    assert table.count == 100
+    assert all(digest in table for digest in digests)
+    assert key_digest(_key("missing")) not in table
+
+
+def test_recent_event_ids_keeps_two_generations():
+    ids = RecentEventIds(generation_size=2)
+    ids.add_many([_key("a"), _key("b")])
+    ids.add(_key("c"))
+    assert _key("a") in ids and _key("b") in ids and _key("c") in ids
+
+    # Aktif nesil dolunca en eski nesil atılır
+    ids.add(_key("d"))
+    ids.add(_key("e"))
+    assert _key("a") not in ids
+    assert _key("c") in ids and _key("e") in ids
+
+
+def test_key_digest_separates_fields():
+    assert key_digest(("t1", "p1", "e1")) != key_digest(("t1", "p", "1e1"))
+    assert key_digest(("t1", "p1", "e1")) != key_digest(("t2", "p1", "e1"))
+
+
+def test_split_duplicates(monkeypatch):
+    monkeypatch.setattr(dedup, "recent_event_ids", RecentEventIds(generation_size=10))
+    dedup.recent_event_ids.add(_key("seen"))
+    documents = [
+        {"tenant_id": "t1", "project_id": "p1", "event_id": "seen"},
+        {"tenant_id": "t1", "project_id": "p1", "event_id": "new"},
+        {"tenant_id": "t1", "project_id": "p1", "event_id": "new"},
+        {"tenant_id": "t1", "project_id": "p1", "event_id": ""},
+        {"tenant_id": "t1", "project_id": "p1"},
+    ]
+    unique, duplicates = split_duplicates(documents)
+    assert duplicates == 2
+    assert [document.get("event_id") for document in unique] == ["new", "", None]
+    assert event_key(documents[3]) is None
@@ -0,0 +1,95 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.dwell import DWELL_CAP_SECONDS, DWELL_SKETCH_ACCURACY, QuantileSketch, session_dwell_times
+
+
+def _sketch(values, **kwargs):
+    sketch = QuantileSketch(**kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("q", [0.0, 0.25, 0.5, 0.9, 0.99, 1.0])
+def test_quantile_relative_error(q):
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(2, 1.5) for _ in range(5000))
+    expected = values[math.floor(q * (len(values) - 1))]
+    estimate = _sketch(values).quantile(q)
+    assert abs(estimate - expected) <= DWELL_SKETCH_ACCURACY * expected + 1e-9
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean() is None
+
+
+def test_weights_match_repeated_values():
+    weighted = QuantileSketch()
+    weighted.add(10, weight=3)
+    weighted.add(100)
+    repeated = _sketch([10, 10, 10, 100])
+    assert weighted.bins == repeated.bins
+    assert weighted.count == repeated.count == 4
+    assert weighted.mean() == pytest.approx(32.5)
+    for q in (0.1, 0.5, 0.9):
+        assert weighted.quantile(q) == repeated.quantile(q)
+
+
+def test_weights_shift_quantiles():
+    sketch = QuantileSketch()
+    sketch.add(10)
+    sketch.add(100, weight=3)
+    assert sketch.quantile(0.5) == pytest.approx(100, rel=DWELL_SKETCH_ACCURACY)
+    assert _sketch([10, 100]).quantile(0.5) == pytest.approx(10, rel=DWELL_SKETCH_ACCURACY)
+
+
+def test_merge_equals_single_sketch():
+    values = [0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55]
+    merged = _sketch(values[:4])
+    merged.merge(_sketch(values[4:]))
+    whole = _sketch(values)
+    assert merged.bins == whole.bins
+    assert merged.count == whole.count
+    assert merged.total == pytest.approx(whole.total)
+
+
+def test_dict_round_trip():
+    sketch = _sketch([1, 2, 3])
+    sketch.add(4, weight=2.5)
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.bins == sketch.bins
+    assert restored.count == sketch.count
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+
+def _events(*items):
+    start = datetime(2024, 1, 1)
+    return [
+        {"event_name": name, "screen_token": token, "timestamp": start + timedelta(seconds=offset)}
+        for name, token, offset in items
+    ]
+
+
+def test_session_dwell_times():
+    events = _events(
+        ("screen_view", "A", 0),
+        ("tap", "A", 5),
+        ("screen_view", "B", 10),
+        ("screen_view", "C", 10 + DWELL_CAP_SECONDS * 2),
+        ("tap", "C", 20 + DWELL_CAP_SECONDS * 2),
+    )
+    assert session_dwell_times(events) == [
+        ("A", 10),
+        ("B", DWELL_CAP_SECONDS),
+        ("C", 10),
+    ]
+
+
+def test_session_dwell_times_without_views():
+    assert session_dwell_times(_events(("tap", "A", 0))) == []
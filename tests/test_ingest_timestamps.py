@@ -0,0 +1,131 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.ingest import read_event_payload, read_batch_payload, build_event_document, validate_event
+from app.session_summary import summary_update
+
+
+class FakeRequest:
+    """read_*_payload fonksiyonlarının kullandığı kadarıyla Request"""
+
+    def __init__(self, body, content_type="application/json"):
+        self.headers = {"content-type": content_type}
+        self._body = body
+
+    async def body(self):
+        return self._body
+
+
+def _event(**extra):
+    event = {"screen_token": "ABC123", "session_id": "s1", "event_name": "screen_view"}
+    event.update(extra)
+    return event
+
+
+def _documents(events):
+    return [build_event_document(event, "t1", "p1", "com.example") for event in events]
+
+
+def test_json_timestamp_is_naive_utc():
+    body = json.dumps(_event(timestamp="2024-01-01T10:00:00+03:00")).encode()
+    event = asyncio.run(read_event_payload(FakeRequest(body)))
+    assert event["timestamp"] == datetime(2024, 1, 1, 7, 0, 0)
+    assert event["timestamp"].tzinfo is None
+
+
+def test_summary_update_with_mixed_timestamps():
+    # "Z" timestamp'li event ile timestamp'siz (sunucu zamanı atanan) event aynı batch'te
+    body = json.dumps([_event(timestamp="2024-01-01T10:00:00Z"), _event()]).encode()
+    documents = _documents(asyncio.run(read_batch_payload(FakeRequest(body))))
+    update = summary_update(documents)
+    assert update["$min"]["summary.first_event_at"] == datetime(2024, 1, 1, 10, 0, 0)
+    assert update["$max"]["summary.last_event_at"].tzinfo is None
+
+
+class FakeCollection:
+    """bulk_write çağrılarını kaydeden koleksiyon"""
+
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def test_touch_devices_with_mixed_timestamps(monkeypatch):
+    from app import devices
+
+    async def resolve(keys):
+        return {key: "d1" for key in keys}
+
+    collection = FakeCollection()
+    monkeypatch.setattr(devices, "_resolve_devices", resolve)
+    monkeypatch.setattr(devices, "devices_collection", collection)
+    monkeypatch.setattr(devices, "_last_touched", devices._LRUCache(10))
+
+    body = json.dumps([_event(timestamp="2099-01-01T00:00:00Z"), _event()]).encode()
+    documents = _documents(asyncio.run(read_batch_payload(FakeRequest(body))))
+    asyncio.run(devices.touch_devices(documents))
+
+    assert len(collection.operations) == 1
+    assert collection.operations[0]._doc["$max"]["last_seen"] == datetime(2099, 1, 1)
+
+
+def test_record_event_stats_with_z_timestamp(monkeypatch):
+    from app import project_stats
+
+    collection = FakeCollection()
+    monkeypatch.setattr(project_stats, "project_stats_collection", collection)
+
+    body = json.dumps([_event(timestamp="2024-01-01T10:30:00Z"), _event()]).encode()
+    documents = _documents(asyncio.run(read_batch_payload(FakeRequest(body))))
+    asyncio.run(project_stats.record_event_stats(documents))
+
+    hours = {operation._filter["hour"]: operation._doc for operation in collection.operations}
+    assert hours[datetime(2024, 1, 1, 10)]["$max"]["last_event_at"] == datetime(2024, 1, 1, 10, 30)
+    assert all(update["$max"]["last_event_at"].tzinfo is None for update in hours.values())
+
+
+def _msgpack_request(payload):
+    import msgpack
+    return FakeRequest(msgpack.packb(payload, use_bin_type=True), "application/msgpack")
+
+
+def test_msgpack_numeric_timestamp():
+    event = asyncio.run(read_event_payload(_msgpack_request(_event(timestamp=1704103200))))
+    assert event["timestamp"] == datetime(2024, 1, 1, 10, 0, 0)
+
+
+@pytest.mark.parametrize("timestamp", [1e20, float("nan"), float("inf"), -1e18])
+def test_msgpack_out_of_range_timestamp_is_rejected(timestamp):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_event_payload(_msgpack_request(_event(timestamp=timestamp))))
+    assert error.value.status_code == 422
+
+
+def test_validate_event_rejects_bytes_metadata_keys():
+    with pytest.raises(HTTPException) as error:
+        validate_event(_event(metadata={"plan": "pro", "nested": {b"raw": 1}}))
+    assert error.value.status_code == 422
+
+
+def test_validate_event_accepts_nested_metadata():
+    event = validate_event(_event(metadata={"plan": "pro", "items": [{"id": 1}]}, event_id="e1"))
+    assert event["metadata"] == {"plan": "pro", "items": [{"id": 1}]}
+    assert event["event_id"] == "e1"
+
+
+@pytest.mark.parametrize("raw", [
+    [],
+    {"session_id": "s1", "event_name": "screen_view"},
+    _event(timestamp=True),
+    _event(metadata=[1, 2]),
+    _event(event_id=5),
+])
+def test_validate_event_rejects_invalid_events(raw):
+    with pytest.raises(HTTPException):
+        validate_event(raw)
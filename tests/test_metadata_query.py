@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import metadata_query
+from app.metadata_query import build_filter, build_metadata_filter
+
+
+class FakeQueryParams:
+    def __init__(self, items):
+        self._items = items
+
+    def multi_items(self):
+        return list(self._items)
+
+
+class FakeRequest:
+    def __init__(self, items):
+        self.query_params = FakeQueryParams(items)
+
+
+class FakeProjects:
+    def __init__(self, project):
+        self.project = project
+
+    async def find_one(self, query, projection=None):
+        return self.project
+
+
+def test_build_filter_equality_matches_string_and_number():
+    assert build_filter([("plan", "eq", "3")]) == {"metadata.plan": {"$in": [3, "3"]}}
+    assert build_filter([("plan", "eq", "pro")]) == {"metadata.plan": {"$in": ["pro"]}}
+    assert build_filter([("beta", "eq", "true")]) == {"metadata.beta": {"$in": [True, "true"]}}
+
+
+def test_build_filter_in_and_ne():
+    assert build_filter([("plan", "in", "pro,2")]) == {"metadata.plan": {"$in": ["pro", 2, "2"]}}
+    assert build_filter([("plan", "ne", "2")]) == {"metadata.plan": {"$nin": [2, "2"]}}
+
+
+def test_build_filter_range_operators_are_coerced_and_combined():
+    query = build_filter([("price", "gte", "1.5"), ("price", "lt", "10")])
+    assert query == {"metadata.price": {"$gte": 1.5, "$lt": 10}}
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    counted = []
+
+    async def fake_count(tenant_id, project_id):
+        counted.append(project_id)
+        return 1000
+
+    def configure(indexed_fields, wildcard=False):
+        monkeypatch.setattr(metadata_query, "METADATA_WILDCARD_INDEX", wildcard)
+        monkeypatch.setattr(
+            metadata_query, "projects_collection",
+            FakeProjects({"indexed_metadata_fields": indexed_fields})
+        )
+        monkeypatch.setattr(metadata_query, "_project_event_count", fake_count)
+        monkeypatch.setattr(metadata_query, "METADATA_UNINDEXED_SCAN_LIMIT", 100)
+        return counted
+
+    return configure
+
+
+def _plan(items):
+    return asyncio.run(build_metadata_filter(FakeRequest(items), "t1", "p1"))
+
+
+def test_planner_allows_indexed_fields(planner):
+    counted = planner(["plan"])
+    assert _plan([("metadata.plan", "pro"), ("limit", "10")]) == {"metadata.plan": {"$in": ["pro"]}}
+    assert counted == []
+
+
+def test_planner_rejects_unindexed_fields_on_large_projects(planner):
+    planner(["plan"])
+    with pytest.raises(HTTPException) as exc:
+        _plan([("metadata.plan", "pro"), ("metadata.country", "TR")])
+    assert exc.value.status_code == 400
+    assert "country" in exc.value.detail
+
+
+def test_planner_allows_unindexed_fields_on_small_projects(planner, monkeypatch):
+    planner([])
+    monkeypatch.setattr(metadata_query, "METADATA_UNINDEXED_SCAN_LIMIT", 5000)
+    assert _plan([("metadata.country", "TR")]) == {"metadata.country": {"$in": ["TR"]}}
+
+
+def test_planner_treats_ne_as_unindexed(planner):
+    planner(["plan"])
+    with pytest.raises(HTTPException) as exc:
+        _plan([("metadata.plan__ne", "free")])
+    assert exc.value.status_code == 400
+    assert "plan" in exc.value.detail
+
+
+def test_planner_allows_ne_with_another_indexed_filter(planner):
+    counted = planner(["plan"])
+    query = _plan([("metadata.plan__ne", "free"), ("metadata.plan__in", "pro,team")])
+    assert query == {"metadata.plan": {"$nin": ["free"], "$in": ["pro", "team"]}}
+    assert counted == []
+
+
+def test_planner_wildcard_index_still_rejects_ne(planner):
+    counted = planner([], wildcard=True)
+    assert _plan([("metadata.country", "TR")]) == {"metadata.country": {"$in": ["TR"]}}
+    assert counted == []
+    with pytest.raises(HTTPException):
+        _plan([("metadata.country__ne", "TR")])
+
+
+def test_planner_rejects_invalid_operator(planner):
+    planner(["plan"])
+    with pytest.raises(HTTPException) as exc:
+        _plan([("metadata.plan__like", "pro")])
+    assert exc.value.status_code == 400
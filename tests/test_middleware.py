@@ -0,0 +1,109 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from app import middleware
+from app.middleware import CompressionMiddleware
+
+
+async def _echo_app(scope, receive, send):
+    message = await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": message["body"]})
+
+
+def _call(body, encoding, chunk_size=None):
+    headers = [(b"content-type", b"application/json")]
+    if encoding:
+        headers.append((b"content-encoding", encoding.encode()))
+    scope = {"type": "http", "method": "POST", "path": "/api/events", "headers": headers}
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(_echo_app)(scope, receive, send))
+    status = sent[0]["status"]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return status, body
+
+
+def _message(body):
+    return json.loads(body)["message"]
+
+
+def test_gzip_body_is_decompressed():
+    payload = b'{"events": []}' * 100
+    status, body = _call(gzip.compress(payload), "gzip", chunk_size=64)
+    assert status == 200
+    assert body == payload
+
+
+def test_multi_member_gzip_body_is_decompressed():
+    status, body = _call(gzip.compress(b"first,") + gzip.compress(b"second"), "gzip")
+    assert status == 200
+    assert body == b"first,second"
+
+
+def test_identity_body_is_passed_through():
+    status, body = _call(b"plain", "identity")
+    assert (status, body) == (200, b"plain")
+
+
+def test_gzip_bomb_is_rejected(monkeypatch):
+    monkeypatch.setattr(middleware, "MAX_DECOMPRESSED_BODY_SIZE", 1024)
+    status, body = _call(gzip.compress(b"\0" * (1024 * 1024)), "gzip")
+    assert status == 413
+    assert _message(body) == "Request body too large"
+
+
+def test_size_limit_applies_across_gzip_members(monkeypatch):
+    monkeypatch.setattr(middleware, "MAX_DECOMPRESSED_BODY_SIZE", 1024)
+    member = gzip.compress(b"x" * 600)
+    assert _call(member, "gzip")[0] == 200
+    assert _call(member + member, "gzip")[0] == 413
+
+
+def test_large_compressed_body_is_rejected(monkeypatch):
+    monkeypatch.setattr(middleware, "MAX_COMPRESSED_BODY_SIZE", 100)
+    status, _ = _call(b"x" * 200, "gzip", chunk_size=50)
+    assert status == 413
+
+
+@pytest.mark.parametrize("body", [
+    b"not gzip",
+    gzip.compress(b"payload")[:-10],
+    gzip.compress(b"payload") + b"trailing junk",
+])
+def test_invalid_gzip_body_is_rejected(body):
+    status, response = _call(body, "gzip")
+    assert status == 400
+    assert _message(response) == "Invalid compressed request body"
+
+
+def test_unsupported_encoding_is_rejected(monkeypatch):
+    assert _call(b"data", "br")[0] == 415
+    monkeypatch.setattr(middleware, "zstandard", None)
+    status, body = _call(b"data", "zstd")
+    assert status == 415
+    assert _message(body) == "Unsupported Content-Encoding: zstd"
+
+
+def test_multi_frame_zstd_body_is_decompressed(monkeypatch):
+    zstandard = pytest.importorskip("zstandard")
+    compressor = zstandard.ZstdCompressor()
+    body = compressor.compress(b"first,") + compressor.compress(b"second")
+    assert _call(body, "zstd") == (200, b"first,second")
+    monkeypatch.setattr(middleware, "MAX_DECOMPRESSED_BODY_SIZE", 1024)
+    assert _call(compressor.compress(b"\0" * (1024 * 1024)), "zstd")[0] == 413
@@ -0,0 +1,97 @@
+import random
+from collections import defaultdict
+
+import numpy as np
+
+from app.retention import first_seen, retention_matrix
+
+
+def _arrays(rows):
+    devices, days, versions = zip(*rows)
+    return (
+        np.array(devices, dtype=np.int32),
+        np.array(days, dtype=np.int32),
+        np.array(versions, dtype=np.int32),
+    )
+
+
+def _reference(rows, retention_days=(1, 7, 30)):
+    # Aynı matrisin düz Python ile hesaplanması
+    first = {}
+    for device, day, version in sorted(rows, key=lambda row: (row[0], row[1])):
+        first.setdefault(device, (day, version))
+    cohorts = defaultdict(lambda: {"size": 0.0, "retained": defaultdict(set)})
+    for device, (day, version) in first.items():
+        cohorts[(day, version)]["size"] += 1
+    for device, day, _ in rows:
+        first_day, version = first[device]
+        if day - first_day in retention_days:
+            cohorts[(first_day, version)]["retained"][str(day - first_day)].add(device)
+    return {
+        key: {"size": row["size"], "retained": {n: float(len(ids)) for n, ids in row["retained"].items()}}
+        for key, row in cohorts.items()
+    }
+
+
+def _by_cohort(result):
+    return {
+        (row["cohort_day"], row["version_code"]): {"size": row["size"], "retained": row["retained"]}
+        for row in result
+    }
+
+
+def test_first_seen_picks_earliest_day_and_its_version():
+    devices, days, versions = _arrays([
+        (0, 12, 1),
+        (1, 5, 0),
+        (0, 10, 0),
+        (0, 11, 2),
+    ])
+    first_day, first_version = first_seen(devices, days, versions, n_devices=3)
+    assert first_day.tolist() == [10, 5, -1]
+    assert first_version.tolist() == [0, 0, -1]
+
+
+def test_first_seen_empty():
+    empty = np.array([], dtype=np.int32)
+    first_day, first_version = first_seen(empty, empty, empty, n_devices=2)
+    assert first_day.tolist() == [-1, -1]
+    assert first_version.tolist() == [-1, -1]
+
+
+def test_retention_matrix_counts_each_device_once():
+    rows = [
+        (0, 100, 0), (0, 101, 0), (0, 101, 0), (0, 107, 0),
+        (1, 100, 0), (1, 130, 0),
+        (2, 101, 1), (2, 102, 1),
+    ]
+    devices, days, versions = _arrays(rows)
+    first_day, first_version = first_seen(devices, days, versions, n_devices=3)
+    result = retention_matrix(devices, days, first_day, first_version, n_versions=2)
+    assert _by_cohort(result) == {
+        (100, 0): {"size": 2.0, "retained": {"1": 1.0, "7": 1.0, "30": 1.0}},
+        (101, 1): {"size": 1.0, "retained": {"1": 1.0}},
+    }
+
+
+def test_retention_matrix_skips_devices_without_first_day():
+    devices, days, _ = _arrays([(0, 10, 0), (1, 11, 0)])
+    first_day = np.array([10, -1], dtype=np.int32)
+    first_version = np.array([0, -1], dtype=np.int32)
+    result = retention_matrix(devices, days, first_day, first_version, n_versions=1)
+    assert _by_cohort(result) == {(10, 0): {"size": 1.0, "retained": {}}}
+
+
+def test_retention_matrix_empty():
+    empty = np.array([], dtype=np.int32)
+    first_day = np.full(2, -1, dtype=np.int32)
+    assert retention_matrix(empty, empty, first_day, first_day, n_versions=0) == []
+
+
+def test_retention_matrix_matches_reference():
+    rng = random.Random(7)
+    rows = [(rng.randrange(200), 1000 + rng.randrange(60), rng.randrange(3)) for _ in range(3000)]
+    devices, days, versions = _arrays(rows)
+    first_day, first_version = first_seen(devices, days, versions, n_devices=200)
+    result = retention_matrix(devices, days, first_day, first_version, n_versions=3)
+    assert _by_cohort(result) == _reference(rows)
@@ -0,0 +1,90 @@
+import random
+from collections import Counter
+
+import pytest
+
+from app.trending import SpaceSaving, merge_counters
+
+
+def _stream(seed, length=2000, keys=50):
+    rng = random.Random(seed)
+    # Zipf benzeri dağılım: az sayıda baskın anahtar
+    return [f"k{min(int(rng.paretovariate(1.2)), keys)}" for _ in range(length)]
+
+
+def _summarize(stream, capacity):
+    summary = SpaceSaving(capacity)
+    for key in stream:
+        summary.add(key)
+    return summary
+
+
+def _assert_bounds(counters, floor, truth):
+    for key, true_count in truth.items():
+        if key in counters:
+            count, error = counters[key]
+            assert count - error <= true_count + 1e-9
+            assert true_count <= count + 1e-9
+        else:
+            assert true_count <= floor + 1e-9
+
+
+def test_space_saving_exact_below_capacity():
+    summary = _summarize(["a", "b", "a", "c", "a"], capacity=5)
+    assert summary.counters == {"a": [3, 0.0], "b": [1, 0.0], "c": [1, 0.0]}
+    assert summary.floor() == 0.0
+
+
+def test_space_saving_replaces_smallest_counter():
+    summary = _summarize(["a", "a", "b", "c"], capacity=2)
+    assert summary.counters == {"a": [2, 0.0], "c": [2, 1]}
+    assert summary.floor() == 2
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_space_saving_bounds(seed):
+    stream = _stream(seed)
+    summary = _summarize(stream, capacity=10)
+    truth = Counter(stream)
+    assert len(summary.counters) == 10
+    _assert_bounds(summary.counters, summary.floor(), truth)
+    # N / capacity'den sık görülen anahtarlar mutlaka listededir
+    for key, count in truth.items():
+        if count > len(stream) / 10:
+            assert key in summary.counters
+
+
+def test_space_saving_weights():
+    summary = SpaceSaving(2)
+    summary.add("a", 2.5)
+    summary.add("b", 1.0)
+    summary.add("c", 0.5)
+    assert summary.counters["a"] == [2.5, 0.0]
+    assert summary.counters["c"] == [1.5, 1.0]
+
+
+@pytest.mark.parametrize("capacity", [5, 10, 100])
+def test_merge_counters_bounds(capacity):
+    streams = [_stream(seed) for seed in (4, 5, 6)]
+    parts = []
+    for stream in streams:
+        summary = _summarize(stream, capacity=10)
+        parts.append((summary.counters, summary.floor()))
+    merged, floor = merge_counters(parts, capacity=capacity)
+    truth = Counter(key for stream in streams for key in stream)
+    assert len(merged) <= capacity
+    _assert_bounds(merged, floor, truth)
+
+
+def test_merge_counters_exact_parts():
+    parts = [({"a": [3, 0.0], "b": [1, 0.0]}, 0.0), ({"a": [2, 0.0], "c": [4, 0.0]}, 0.0)]
+    merged, floor = merge_counters(parts, capacity=10)
+    assert merged == {"a": [5, 0.0], "b": [1, 0.0], "c": [4, 0.0]}
+    assert floor == 0.0
+
+
+def test_merge_counters_trims_to_capacity():
+    parts = [({"a": [5, 0.0], "b": [3, 0.0], "c": [1, 0.0]}, 0.0)]
+    merged, floor = merge_counters(parts, capacity=2)
+    assert set(merged) == {"a", "b"}
+    assert floor == 1